@@ -1,7 +1,15 @@
 import datetime
 from dataclasses import dataclass, field
 
-from BtAssessmentLib.deps import (EX2DB, DB2DF, seg_data, change_df_tf, bb, pandas, round_off_tick_size)
+from BtAssessmentLib.deps import ingest, DB2DF, seg_data, resample_session, bb, pandas, RollingBB
+from BtAssessmentLib.cache import FrameCache, frame_key
+from BtAssessmentLib.engine import (bar_arrays, simulate, signal_mask, signal_window, time_of_day, minute_path,
+                                   intrabar_arrays, first_touch, round_off_tick_size, epoch_ns, NS_PER_DAY)
+from BtAssessmentLib.frames import to_records
+from BtAssessmentLib.orderbook import Orderbook
+from BtAssessmentLib.profiling import Profiler, NULL_PROFILER, log_event, enable_logging
+from BtAssessmentLib.stats import summarize
+from BtAssessmentLib.strategy import FrameContext
 
 
 @dataclass
@@ -18,10 +26,12 @@ class BTest:
         Symbol name or identifier.
 
     start_date : str (yyyy-mm-dd hh-mm)
-        Start date and time for the backtest period.
+        Start date and time for the backtest period. Only bars from start_date on are read, so the Bollinger
+        bands warm up from start_date: the first 19 bars have no bands and cannot signal. Earlier versions read
+        the whole table and only filtered by time of day, use an earlier start_date to reproduce their bands.
 
     end_date : str (yyyy-mm-dd hh-mm)
-        End date and time for the backtest period.
+        End date and time for the backtest period. Bars after it are not read.
 
     bar_interval : str
         Bar interval for price data. Possible values: '1min', '5min', '15min', '30min', '60min'.
@@ -40,6 +50,7 @@ class BTest:
 
     excel_source : str (optional)
         Path to an Excel file with historical price data in xlsx format.
+        It is loaded into the database only if that version of the file is not already there.
 
     db_name : str (default: 'FastDb')
         Database name where the historical price data is stored.
@@ -52,8 +63,12 @@ class BTest:
 
     change_bar_interval_at_start : bool (default: False)
         Whether to change the bar interval at the start of the backtest.
+        Bars are built by deps.resample_session: buckets are anchored to the session start of start_date,
+        only real session buckets are kept and their Bars/Missing columns flag incomplete buckets.
     log : bool (default: False)
-        Whether to print transactions for the backtest process.
+        Whether to log the signals and transactions of the backtest. Events go to the 'BtAssessmentLib' logger
+        (printed to stdout unless the logger is configured) with the event name and fields as record.event
+        and record.fields. Nothing is formatted when log is False.
     pref_sl : bool (default: True)
         Whether to prefer stop loss over target profit.
     ordertype : str (default: 'CNC')
@@ -61,6 +76,46 @@ class BTest:
         MIS will be cleared at or before 15:15
         CNC will be carried forward to next day
         NRML will be carried forward to next day
+    engine : str (default: 'loop')
+        Execution engine for the strategy. Possible values: 'loop', 'vectorized'.
+        'loop' walks every bar as a dict, 'vectorized' precomputes the signal masks on NumPy arrays
+        and only steps through bars while a position is open. Both produce the same orderbook.
+    read_only : bool (default: False)
+        Read the database through a per-thread read-only connection that is reused across BTest instances.
+    stream : bool (default: False)
+        Do not load any data, bars are fed one at a time through on_bar() (see stream.replay).
+        The Bollinger bands are then maintained incrementally and run() returns the orders emitted so far.
+    cache_dir : str (optional)
+        Directory of a FrameCache. The prepared frame (bars and Bollinger bands) is looked up there before
+        touching the database and stored after a miss. Entries are keyed on ticker, dates, interval, session
+        window, band parameters and the version stamp of the table (a content hash of bars when they are given).
+        main_df stays None on a cache hit.
+    cache_max_bytes : int (default: 1 GiB)
+        Size limit of cache_dir, least recently used entries are evicted beyond it.
+    storage : str (default: 'sqlite')
+        'sqlite' reads table_name from the SQLite database db_name, 'mmap' reads the BarStore directory db_name
+        (see barstore.BarStore.import_table) as zero-copy views of the requested date range.
+    bars : DataFrame (optional)
+        Bars to use instead of reading db_name, e.g. the 1-minute frame shared by several intervals. With
+        change_bar_interval_at_start they may also be coarser bars whose interval divides bar_interval (like
+        the prepared frame of a 5min BTest for 15min), resample_session aggregates them hierarchically.
+    strategy : strategy.Strategy (optional)
+        Declarative entry/exit rules replacing close > UB and close < UB, e.g.
+        Strategy(entry='close > bb.UB and rsi > 70', exit='close < bb.MB', indicators={'bb': BB(20, 2),
+        'rsi': RSI(14)}). Rules are evaluated as vectorized masks, so it requires engine='vectorized'.
+        SL/TP, session timing and MIS square-off are unchanged.
+    intrabar : bool (default: False)
+        Resolve bars that touch both the stop loss and the target on the 1-minute bars inside them: the exit
+        is the one touched by the earliest minute, pref_sl only decides when that minute touches both. Signals
+        and all other exits still use the coarse bars, so it needs change_bar_interval_at_start. The minute
+        path is kept as arrays with a precomputed [first, stop) row range per bar, so only the ambiguous bars
+        are drilled into. Not available with stream=True.
+    minute_bars : DataFrame (optional)
+        1-minute bars used by intrabar when bars holds coarser bars. Defaults to the 1-minute source frame
+        (read again from db_name after a cache hit).
+    profile : bool (default: False)
+        Time every stage (load, cache, DB2DF, resample, bb, to_dict, strategy, ...) and count bars, NaN-skipped
+        bars, signal bars and orders. The numbers are returned by profile_report().
 
     """
 
@@ -80,6 +135,17 @@ class BTest:
     log: bool = field(default=False)
     pref_sl: bool = field(default=True)
     ordertype: str = field(default='CNC')
+    engine: str = field(default='loop')
+    read_only: bool = field(default=False)
+    stream: bool = field(default=False)
+    cache_dir: str = field(default='')
+    cache_max_bytes: int = field(default=1 << 30)
+    storage: str = field(default='sqlite')
+    bars: object = field(default=None, repr=False)
+    strategy: object = field(default=None)
+    intrabar: bool = field(default=False)
+    minute_bars: object = field(default=None, repr=False)
+    profile: bool = field(default=False)
 
     __df = None
     main_df = None
@@ -94,6 +160,9 @@ class BTest:
     __curr_open = None
     __curr_ub = None
     __df_dict = None
+    __frame_ctx = None
+    __minutes = None
+    __intrabar = None
     __sellprice = None
     __buyprice = None
     __curr_dt = None
@@ -110,8 +179,20 @@ class BTest:
         assert self.capital > 0, "Capital cannot be zero or negative."
         assert self.stop_loss > 0, "Stop Loss cannot be zero or negative."
         assert self.target > 0, "Target cannot be zero or negative."
+        assert self.engine in ('loop', 'vectorized'), "Engine must be either 'loop' or 'vectorized'."
+        assert self.storage in ('sqlite', 'mmap'), "Storage must be either 'sqlite' or 'mmap'."
+        assert self.storage == 'sqlite' or self.excel_source == '', \
+            "excel_source is ingested into SQLite, import it into the bar store with BarStore.import_table."
+        assert self.strategy is None or (self.engine == 'vectorized' and not self.stream), \
+            "A strategy spec needs engine='vectorized' and stream=False."
+        assert not self.intrabar or (self.change_bar_interval_at_start and not self.stream), \
+            "intrabar needs change_bar_interval_at_start=True and stream=False."
+        self.profiler = Profiler() if self.profile else NULL_PROFILER
+        if self.log:
+            enable_logging()
         if self.excel_source != '':
-            self.load_data()
+            with self.profiler.stage('ingest'):
+                self.load_data()
         self.__start_date = datetime.datetime.strptime(self.start_date, '%Y-%m-%d %H-%M')
         self.__end_date = datetime.datetime.strptime(self.end_date, '%Y-%m-%d %H-%M')
         self.__s_hour = self.__start_date.hour
@@ -119,26 +200,85 @@ class BTest:
         self.__e_hour = self.__end_date.hour
         self.__e_minute = self.__end_date.minute
         self.__timeframe = int(self.bar_interval.lower().replace('min', ''))
-        self.__assign_data()
-        self.__df_dict = self.__df.to_dict('index')
+        if self.stream:
+            self.__start_time = datetime.time(self.__s_hour, self.__s_minute)
+            self.__end_time = datetime.time(self.__e_hour, self.__e_minute)
+            self.__bands = RollingBB(window=20, std=1)
+            self.__reset_strategy()
+        else:
+            with self.profiler.stage('load'):
+                self.__assign_data()
+                if self.intrabar:
+                    with self.profiler.stage('intrabar'):
+                        self.__assign_minutes()
 
     def __assign_data(self):
         use_cols = ['OpenValue', 'High', 'Low', 'CloseValue']
-        if self.excel_source != '':
-            self.load_data()
-        self.__df = DB2DF(db_name=self.db_name, table_name=self.table_name, sym=self.ticker).copy()
+        bars = None
+        if self.bars is not None:
+            # Extra columns of the caller's frame (bands, flags with NaN, ...) would drop bars in the NaN check.
+            # Bars is kept for resampling coarser bars hierarchically.
+            keep = use_cols + (['Bars'] if self.change_bar_interval_at_start and 'Bars' in self.bars.columns else [])
+            bars = self.bars[keep]
+        cache = FrameCache(self.cache_dir, self.cache_max_bytes) if self.cache_dir != '' else None
+        if cache is not None:
+            inputs = frame_key(self.db_name, self.table_name, self.ticker, self.__start_date, self.__end_date,
+                               self.__timeframe, self.change_bar_interval_at_start, window=20, std=1,
+                               storage=self.storage, bars=bars)
+            # No version stamp (missing database): nothing to key a cache entry on.
+            cache = None if inputs['version'] is None else cache
+        if cache is not None:
+            key = cache.key(**inputs)
+            with self.profiler.stage('cache'):
+                self.__df = cache.get(key)
+            if self.__df is not None:
+                self.profiler.count('cache_hits')
+                return
+        if bars is not None:
+            self.__df = bars
+        else:
+            with self.profiler.stage('DB2DF'):
+                self.__df = DB2DF(db_name=self.db_name, table_name=self.table_name, sym=self.ticker,
+                                  start_date=self.__start_date, end_date=self.__end_date, columns=use_cols,
+                                  read_only=self.read_only, storage=self.storage)
         if len(self.__df) == 0:
             raise Exception("No data found in database. Perhaps wrong symbol or date?")
-        self.main_df = self.__df.copy()
-        self.__df = self.__df[use_cols].copy()
-        if self.change_bar_interval_at_start:
-            self.__df = change_df_tf(self.__df, x_minutes=self.__timeframe).copy()
-        self.__df = seg_data(self.__df, start_h=self.__s_hour, start_m=self.__s_minute, end_h=self.__e_hour,
-                             end_m=self.__e_minute).copy()
-        self.__df[['MB', 'UB', 'LB']] = bb(self.__df, window=20, std=1)
+        if self.storage == 'mmap' or self.bars is not None:
+            # Shared or read-only input, every step below builds new arrays.
+            self.main_df = self.__df if self.bars is None else self.bars
+        else:
+            self.main_df = self.__df.copy()
+            self.__df = self.__df[use_cols].copy()
+        with self.profiler.stage('resample'):
+            if self.change_bar_interval_at_start:
+                self.__df = resample_session(self.__df, x_minutes=self.__timeframe, start_h=self.__s_hour,
+                                             start_m=self.__s_minute, end_h=self.__e_hour, end_m=self.__e_minute)
+            else:
+                self.__df = seg_data(self.__df, start_h=self.__s_hour, start_m=self.__s_minute,
+                                     end_h=self.__e_hour, end_m=self.__e_minute).copy()
+                if self.bars is not None:
+                    # When no bar is dropped the index still shares its lookup cache with the caller's frame, and
+                    # pandas does not build that cache thread-safely for BTests of the same bars run in threads.
+                    self.__df.index = self.__df.index.copy(deep=True)
+        with self.profiler.stage('bb'):
+            self.__df[['MB', 'UB', 'LB']] = bb(self.__df, window=20, std=1)
+        if cache is not None:
+            with self.profiler.stage('cache'):
+                cache.put(key, self.__df, **inputs)
+
+    def __assign_minutes(self):
+        df = self.minute_bars if self.minute_bars is not None else self.main_df
+        if df is None:
+            with self.profiler.stage('DB2DF'):
+                df = DB2DF(db_name=self.db_name, table_name=self.table_name, sym=self.ticker,
+                           start_date=self.__start_date, end_date=self.__end_date,
+                           columns=['OpenValue', 'High', 'Low', 'CloseValue'], read_only=self.read_only,
+                           storage=self.storage)
+        assert 'Bars' not in df.columns, "intrabar needs 1-minute bars, pass them as minute_bars."
+        self.__minutes = minute_path(df, self.__s_hour * 60 + self.__s_minute, self.__e_hour * 60 + self.__e_minute)
 
     def load_data(self):
-        EX2DB(self.excel_source, self.db_name, self.table_name, if_exists=self.if_exists)
+        return ingest(self.excel_source, self.db_name, self.table_name, if_exists=self.if_exists)
 
     def get_df(self):
         return self.__df
@@ -190,9 +330,6 @@ class BTest:
         self.__signal = False
         self.__trade_status = True
         self.add_order(orderside='Short', reason='Entry')
-        print(
-            f"Short Ent @ {self.__curr_dt} -SP:{self.__sellprice} "
-            f"SL:{self.__curr_sl} TP:{self.__curr_tp}\n{self.__row}") if self.log else None
 
     def trade_sig_time_validation(self):
         return self.__curr_dt + datetime.timedelta(minutes=self.__timeframe)
@@ -223,26 +360,22 @@ class BTest:
         else:
             self.__pnl = round((self.__sellprice - self.__buyprice) * self.quantity, 2)
         self.capital = self.capital + self.__pnl
-        print(f"Capital: {self.capital}") if self.log else None
         pnl_to_add = self.__pnl if orderside == 'Long' else None
-        order_log = {"Ticker": self.ticker, "OrderDateTime": self.__curr_dt, "InstrumentPrice": ip,
-                     "Quantity": self.quantity, "OrderPrice": ip * self.quantity,
-                     "TPPrice": self.__curr_tp, "SLPrice": self.__curr_sl, "OrderSide": orderside,
-                     "Status": st, "Reason": reason, "Balance": self.capital, "PnL": pnl_to_add}
-        self.__orderbook.append(order_log)
-        del order_log
+        if self.log:
+            log_event('order', ticker=self.ticker, time=self.__curr_dt, side=orderside, reason=reason, price=ip,
+                      sl=self.__curr_sl, tp=self.__curr_tp, pnl=pnl_to_add, capital=self.capital, bar=self.__row)
+        self.__orderbook.append(self.__curr_dt.value, ip, self.quantity, ip * self.quantity, self.__curr_tp,
+                                self.__curr_sl, orderside, st, reason, self.capital, pnl_to_add)
 
     def add_sl_trade(self):
         reason = "SL Hit"
         self.__buyprice = self.__curr_sl
         self.add_order(orderside='Long', reason=reason)
-        print(f"SL hit [{reason}] @ {self.__curr_dt}-{self.__row}\n") if self.log else None
         self.reset_values()
 
     def add_profit_trade(self):
         reason = "TP Hit"
         self.__buyprice = self.__curr_tp
-        print(f"Target hit [{reason}] @ {self.__curr_dt}-{self.__row}\n") if self.log else None
         self.add_order(orderside='Long', reason=reason)
         self.reset_values()
 
@@ -251,7 +384,6 @@ class BTest:
         self.__reverse = False
         self.__signal = False
         self.__buyprice = self.__curr_open
-        print(f"Trend Rev @ {self.__curr_dt}-{self.__row} [{reason}] \n") if self.log else None
         self.add_order(orderside='Long', reason=reason)
 
         self.reset_values()
@@ -259,36 +391,160 @@ class BTest:
     def auto_exit(self):
         reason = 'Auto SquaredOff'
         self.__buyprice = self.__curr_open
-        print(f"MIS @ {self.__curr_dt}-{self.__row} [{reason}] \n") if self.log else None
         self.add_order(orderside='Long', reason=reason)
         self.reset_values()
 
-    def __strategy(self):
-        self.__orderbook = []
+    def __reset_strategy(self):
+        self.__orderbook = Orderbook(self.ticker, self.capital)
         self.__curr_sl, self.__curr_tp, self.__signal, self.__trade_status = None, None, False, False
-        for date_index, row in self.__df_dict.items():
-            if all(not pandas.isna(x) for x in row.values()):
-                self.assign_values(row)
-                self.__curr_dt = date_index
-                if self.__reverse is True:
-                    self.add_reversion_trade()
-                if self.entry_statement():
-                    self.add_entry_trade()
-                if self.__trade_status is True:
-                    if self.loss_statement():
-                        self.add_sl_trade() if self.pref_sl is True else\
-                            self.add_profit_trade() if self.profit_statement() else None
-                    elif self.profit_statement():
-                        self.add_profit_trade()
-                if self.reversion_statement():
-                    self.__reverse = True
-                if self.mis_square_off_statement():
-                    self.auto_exit()
-                elif self.signal_statement():
-                    self.__entry_time = self.trade_sig_time_validation()
-                    self.__signal = True
-                    print(f'Short Sig @ {date_index}-{row} {self.__entry_time}') if self.log else None
 
-    def run(self):
-        self.__strategy()
+    def __step(self, date_index, row, bar_pos=None):
+        # bar_pos is the row of the bar in the prepared frame, used to find its 1-minute bars with intrabar.
+        self.assign_values(row)
+        self.__curr_dt = date_index
+        if self.__reverse is True:
+            self.add_reversion_trade()
+        if self.entry_statement():
+            self.add_entry_trade()
+        if self.__trade_status is True:
+            if self.__intrabar is not None and self.loss_statement() and self.profit_statement():
+                self.add_sl_trade() if first_touch(self.__intrabar, bar_pos, self.__curr_sl, self.__curr_tp,
+                                                   self.pref_sl) == 'SL Hit' else self.add_profit_trade()
+            elif self.loss_statement():
+                self.add_sl_trade() if self.pref_sl is True else\
+                    self.add_profit_trade() if self.profit_statement() else None
+            elif self.profit_statement():
+                self.add_profit_trade()
+        if self.reversion_statement():
+            self.__reverse = True
+        if self.mis_square_off_statement():
+            self.auto_exit()
+        elif self.signal_statement():
+            self.__entry_time = self.trade_sig_time_validation()
+            self.__signal = True
+            if self.log:
+                log_event('signal', ticker=self.ticker, time=date_index, entry_time=self.__entry_time, bar=row)
+
+    def __strategy(self):
+        self.__reset_strategy()
+        if self.__df_dict is None:
+            with self.profiler.stage('to_dict'):
+                self.__df_dict = self.__df.to_dict('index')
+        if self.__minutes is not None and self.__intrabar is None:
+            self.__intrabar = intrabar_arrays(self.__df.index, self.__minutes, self.__timeframe)
+        with self.profiler.stage('strategy'):
+            for bar_pos, (date_index, row) in enumerate(self.__df_dict.items()):
+                if all(not pandas.isna(x) for x in row.values()):
+                    self.__step(date_index, row, bar_pos)
+
+    def on_bar(self, ts, o, h, l, c):
+        """
+        Feed the next bar of a stream=True backtest and return the orders it triggered.
+
+        Bars outside the session window of start_date/end_date are ignored like seg_data does, the Bollinger
+        bands are updated in O(1) and the bar is processed by the same per-bar rules as run().
+        """
+        assert self.stream, "on_bar is only available for BTest(stream=True)."
+        ts = pandas.Timestamp(ts)
+        if not self.__start_time <= ts.time() <= self.__end_time:
+            return []
+        mb, ub, lb = self.__bands.update(c)
+        row = {'OpenValue': o, 'High': h, 'Low': l, 'CloseValue': c, 'MB': mb, 'UB': ub, 'LB': lb}
+        n = len(self.__orderbook)
+        if all(not pandas.isna(x) for x in row.values()):
+            self.__step(ts, row)
+            if self.profile:
+                self.profiler.count('bars')
+                self.profiler.count('signal_bars', int(signal_mask(c, ub, ts.value % NS_PER_DAY,
+                                                                   self.__timeframe, self.ordertype)))
+                self.profiler.count('orders', len(self.__orderbook) - n)
+        elif self.profile:
+            self.profiler.count('nan_skipped')
+        return to_records(self.__orderbook, n)
+
+    def __vectorized_strategy(self):
+        arrays, settings = self.__simulation_inputs()
+        with self.profiler.stage('strategy'):
+            self.__orderbook, self.capital = simulate(self.ticker, **arrays, **settings)
+
+    def __simulation_inputs(self):
+        with self.profiler.stage('bar_arrays'):
+            arrays = bar_arrays(self.__df) if self.strategy is None else \
+                self.strategy.arrays(self.__df, self.__frame_context())
+            if self.__minutes is not None:
+                arrays['intrabar'] = intrabar_arrays(arrays['index'], self.__minutes, self.__timeframe)
+        settings = {'quantity': self.quantity, 'capital': self.capital, 'stop_loss': self.stop_loss,
+                    'target': self.target, 'timeframe': self.__timeframe, 'ordertype': self.ordertype,
+                    'pref_sl': self.pref_sl}
+        return arrays, settings
+
+    def simulation_inputs(self):
+        """
+        (arrays, settings) of the prepared bars: engine.simulate(ticker, **arrays, **settings) returns the
+        orderbook and final capital of run(). Timestamps are int64 nanoseconds, so both hold only NumPy arrays
+        and scalars and are cheap to send to a worker process that never sees the BTest or its frames.
+        With profile=True the bars, nan_skipped and signal_bars counters are counted here.
+        """
+        assert not self.stream, "simulation_inputs is not available for BTest(stream=True)."
+        arrays, settings = self.__simulation_inputs()
+        arrays['index'] = epoch_ns(arrays['index'])
+        if self.profile:
+            self.__count_bars()
+        return arrays, settings
+
+    def __frame_context(self):
+        # Indicators of the strategy are computed once per frame and reused by later runs.
+        if self.__frame_ctx is None:
+            self.__frame_ctx = FrameContext(self.__df)
+        return self.__frame_ctx
+
+    def __count_bars(self):
+        if self.strategy is None:
+            valid = self.__df.notna().all(axis=1).to_numpy()
+            signal = (self.__df['CloseValue'] > self.__df['UB']).to_numpy()
+        else:
+            signal, _, valid = self.strategy.masks(self.__df, self.__frame_context())
+        signal = signal & signal_window(time_of_day(self.__df.index), self.__timeframe, self.ordertype)
+        self.profiler.count('bars', int(valid.sum()))
+        self.profiler.count('nan_skipped', int(len(valid) - valid.sum()))
+        self.profiler.count('signal_bars', int((signal & valid).sum()))
+
+    def pending_signal(self):
+        """Strength (close / UB - 1) of the signal waiting for entry on the next bar, None if there is none."""
+        if self.__signal is True and self.__trade_status is False:
+            return self.__curr_close / self.__curr_ub - 1
+        return None
+
+    def get_orderbook(self):
+        """Columnar Orderbook of the last run (or of the orders streamed so far)."""
         return self.__orderbook
+
+    def summary(self):
+        """Summary metrics of the orderbook (see stats.Summary), computed on the orderbook arrays."""
+        return summarize(self.__orderbook)
+
+    def profile_report(self):
+        """
+        Stages and counters of a profile=True backtest.
+
+        wall/cpu of every stage are seconds summed over its calls, the top level wall/cpu cover loading and
+        running (load + run stages). Counters: bars, nan_skipped, signal_bars (raw count of bars meeting the
+        short signal condition, e.g. Close > UB, within the entry window, whether or not a position was open or
+        an entry followed), orders and cache_hits.
+        """
+        report = self.profiler.report()
+        top = [report['stages'].get(name, {}) for name in ('ingest', 'load', 'run')]
+        return {'ticker': self.ticker, 'engine': self.engine, 'wall': sum(s.get('wall', 0.0) for s in top),
+                'cpu': sum(s.get('cpu', 0.0) for s in top), **report}
+
+    def run(self):
+        if not self.stream:
+            with self.profiler.stage('run'):
+                if self.engine == 'vectorized':
+                    self.__vectorized_strategy()
+                else:
+                    self.__strategy()
+            if self.profile:
+                self.__count_bars()
+                self.profiler.count('orders', len(self.__orderbook))
+        return to_records(self.__orderbook)
@@ -1,4 +1,24 @@
-from BtAssessmentLib.main import BT
-from BtAssessmentLib.BacktestModule import BTest
+"""
+Backtesting of the Bollinger band short strategy.
 
-__all__ = ['BT', 'BTest']
+The public classes are imported on first access, so `import BtAssessmentLib` itself is cheap and modules such as
+BtAssessmentLib.engine (simulate, only NumPy) can be used by worker processes without loading pandas or plotly.
+"""
+import importlib
+
+_EXPORTS = {'BT': 'BtAssessmentLib.main', 'BTest': 'BtAssessmentLib.BacktestModule',
+            'Portfolio': 'BtAssessmentLib.portfolio', 'Strategy': 'BtAssessmentLib.strategy'}
+
+__all__ = ['BT', 'BTest', 'Portfolio', 'Strategy']
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(_EXPORTS[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
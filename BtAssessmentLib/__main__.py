@@ -0,0 +1,5 @@
+import sys
+
+from BtAssessmentLib.cli import main
+
+sys.exit(main())
@@ -0,0 +1,209 @@
+import os
+import struct
+
+import numpy
+
+from BtAssessmentLib.deps import DB2DF, connect, pandas
+
+MAGIC = b'BTBARS01'
+HEADER = struct.Struct('<8sIIqq32x')
+NS_PER_DAY = 24 * 60 * 60 * 10 ** 9
+PRICE_COLUMNS = ['OpenValue', 'High', 'Low', 'CloseValue']
+
+
+class BarStore:
+    """
+    Memory-mapped binary store of 1-minute bars, one pair of files per ticker.
+
+    <ticker>.bars is a 64 byte header (magic, format version, price width, record count, capacity) followed by
+    fixed-width columns of `capacity` slots each: int64 epoch nanoseconds, then OpenValue, High, Low and
+    CloseValue as float64 (or float32). Nanoseconds rather than minutes keep the off-minute timestamps of the
+    source data (09:16:01) that the strategy depends on. <ticker>.idx.npy holds the date -> offset index:
+    (epoch day, first record of that day) for every stored day.
+
+    Reads map the file once and return contiguous NumPy views of only the requested date range, so frame() is a
+    DataFrame over the file itself, nothing is copied or parsed. append() writes into the free slots and publishes
+    the bars by rewriting the record count in the header last, so readers never see a partial append. When the
+    slots run out the file is rewritten with twice the capacity and renamed into place. One writer at a time.
+
+    Parameters:
+    -----------
+    directory : str
+        Store location, created if missing. Used as db_name with storage='mmap'.
+    price_dtype : str (default: 'float64')
+        Width of the prices of newly created tickers, 'float32' halves the size but rounds the prices.
+    """
+
+    def __init__(self, directory, price_dtype='float64'):
+        assert numpy.dtype(price_dtype) in (numpy.float32, numpy.float64), "price_dtype must be float32 or float64."
+        self.directory = directory
+        self.price_dtype = numpy.dtype(price_dtype)
+        os.makedirs(directory, exist_ok=True)
+
+    def __path(self, sym, suffix):
+        return os.path.join(self.directory, f'{sym}{suffix}')
+
+    def tickers(self):
+        return sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith('.bars'))
+
+    @staticmethod
+    def __header(f):
+        magic, version, width, count, capacity = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != 1:
+            raise Exception(f"{f.name} is not a bar store file.")
+        return numpy.dtype(f'<f{width}'), count, capacity
+
+    @staticmethod
+    def __offsets(width, capacity):
+        offsets = {'CreatedOn': HEADER.size}
+        for i, col in enumerate(PRICE_COLUMNS):
+            offsets[col] = HEADER.size + 8 * capacity + i * width * capacity
+        return offsets
+
+    def columns(self, sym):
+        """Memory-mapped columns {'CreatedOn': int64 ns, price column: floats} of one ticker (read-only)."""
+        path = self.__path(sym, '.bars')
+        if not os.path.exists(path):
+            return {'CreatedOn': numpy.empty(0, dtype='int64'),
+                    **{col: numpy.empty(0, dtype=self.price_dtype) for col in PRICE_COLUMNS}}
+        with open(path, 'rb') as f:
+            price_dtype, count, capacity = self.__header(f)
+        mm = numpy.memmap(path, dtype='u1', mode='r')
+        result = {}
+        for col, offset in self.__offsets(price_dtype.itemsize, capacity).items():
+            dtype = numpy.dtype('<i8') if col == 'CreatedOn' else price_dtype
+            result[col] = mm[offset:offset + count * dtype.itemsize].view(dtype)
+        return result
+
+    def index(self, sym):
+        path = self.__path(sym, '.idx.npy')
+        return numpy.load(path) if os.path.exists(path) else numpy.empty((0, 2), dtype='int64')
+
+    def version(self, sym):
+        """Changes whenever bars of sym are appended or rewritten."""
+        try:
+            stat = os.stat(self.__path(sym, '.bars'))
+        except FileNotFoundError:
+            return None
+        with open(self.__path(sym, '.bars'), 'rb') as f:
+            count = self.__header(f)[1]
+        return f'{stat.st_ino}-{count}'
+
+    def offsets(self, sym, start_date=None, end_date=None):
+        """Columns of sym and the record range [first, stop) of [start_date, end_date], found via the day index."""
+        columns = self.columns(sym)
+        ts = columns['CreatedOn']
+        first, stop = 0, len(ts)
+        index = self.index(sym)
+        if len(ts) == 0 or len(index) == 0:
+            return columns, first, stop
+        days, day_offsets = index[:, 0], numpy.minimum(numpy.r_[index[:, 1], len(ts)], len(ts))
+        if start_date is not None:
+            ns = pandas.Timestamp(start_date).value
+            i = numpy.searchsorted(days, ns // NS_PER_DAY)
+            lo, hi = day_offsets[i], day_offsets[min(i + 1, len(days))]
+            first = lo + numpy.searchsorted(ts[lo:hi], ns)
+        if end_date is not None:
+            ns = pandas.Timestamp(end_date).value
+            i = numpy.searchsorted(days, ns // NS_PER_DAY, side='right') - 1
+            if i < 0:
+                stop = 0
+            else:
+                lo, hi = day_offsets[i], day_offsets[i + 1]
+                stop = lo + numpy.searchsorted(ts[lo:hi], ns, side='right')
+        return columns, int(first), int(max(first, stop))
+
+    def read(self, sym, start_date=None, end_date=None, columns=None):
+        """Zero-copy views {'CreatedOn': int64 ns, column: prices} of the bars in [start_date, end_date]."""
+        stored, first, stop = self.offsets(sym, start_date, end_date)
+        columns = PRICE_COLUMNS if columns is None else [c for c in columns if c != 'CreatedOn']
+        return {col: stored[col][first:stop] for col in ['CreatedOn'] + columns}
+
+    def frame(self, sym, start_date=None, end_date=None, columns=None):
+        """DB2DF equivalent: DataFrame over the memory-mapped views, indexed by CreatedOn."""
+        views = self.read(sym, start_date, end_date, columns)
+        index = pandas.DatetimeIndex(views.pop('CreatedOn').view('datetime64[ns]'), name='CreatedOn', copy=False)
+        return pandas.DataFrame(views, index=index, copy=False)
+
+    def append(self, sym, df):
+        """
+        Append bars (DataFrame indexed by time with OpenValue, High, Low, CloseValue) to the ticker.
+
+        The bars must be sorted and start after the last stored bar, e.g. the bars of one new trading day.
+        Returns the number of records stored for sym afterwards.
+        """
+        ts = pandas.DatetimeIndex(df.index).asi8
+        path = self.__path(sym, '.bars')
+        if len(ts) == 0:
+            return len(self.columns(sym)['CreatedOn'])
+        if (numpy.diff(ts) <= 0).any():
+            raise Exception(f"Bars appended to {sym} must be strictly increasing in time.")
+        if not os.path.exists(path):
+            self.__create(path, self.price_dtype, {}, 0, max(len(ts), 1024))
+        with open(path, 'rb') as f:
+            price_dtype, count, capacity = self.__header(f)
+        stored = self.columns(sym)
+        if count > 0 and ts[0] <= stored['CreatedOn'][-1]:
+            raise Exception(f"Bars appended to {sym} must start after {pandas.Timestamp(stored['CreatedOn'][-1])}.")
+        if count + len(ts) > capacity:
+            capacity = max(2 * capacity, count + len(ts))
+            self.__create(path, price_dtype, stored, count, capacity)
+        del stored
+        with open(path, 'r+b') as f:
+            for col, offset in self.__offsets(price_dtype.itemsize, capacity).items():
+                values = ts if col == 'CreatedOn' else df[col].to_numpy().astype(price_dtype)
+                f.seek(offset + count * values.dtype.itemsize)
+                f.write(values.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+            self.__update_index(sym, ts, count)
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, 1, price_dtype.itemsize, count + len(ts), capacity))
+        return count + len(ts)
+
+    def __create(self, path, price_dtype, stored, count, capacity):
+        # Write a file with the stored columns and room for `capacity` bars next to path, then rename it over.
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, 1, price_dtype.itemsize, count, capacity))
+            f.truncate(HEADER.size + capacity * (8 + len(PRICE_COLUMNS) * price_dtype.itemsize))
+            for col, offset in self.__offsets(price_dtype.itemsize, capacity).items():
+                if col in stored:
+                    f.seek(offset)
+                    f.write(numpy.ascontiguousarray(stored[col][:count]).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def __update_index(self, sym, ts, count):
+        days = ts // NS_PER_DAY
+        starts = numpy.flatnonzero(numpy.r_[True, days[1:] != days[:-1]])
+        new = numpy.column_stack([days[starts], starts + count]).astype('int64')
+        index = self.index(sym)
+        if len(index) and index[-1, 0] == new[0, 0]:
+            new = new[1:]
+        tmp = self.__path(sym, '.idx.tmp.npy')
+        numpy.save(tmp, numpy.concatenate([index, new]))
+        os.replace(tmp, self.__path(sym, '.idx.npy'))
+
+    def import_table(self, db_name, table_name='minute_candle', tickers=None):
+        """
+        Import the bars of the SQLite minute_candle table (tickers not yet stored, or all bars after the last
+        stored one for tickers that are). Returns {ticker: records stored}.
+        """
+        if tickers is None:
+            with connect(db_name) as db:
+                tickers = [row[0] for row in db.execute(
+                    f'select distinct InstrumentIdentifier from "{table_name}" order by 1')]
+        counts = {}
+        for sym in tickers:
+            stored = self.columns(sym)['CreatedOn']
+            last = int(stored[-1]) if len(stored) else None
+            del stored
+            df = DB2DF(db_name, table_name, sym, start_date=None if last is None else pandas.Timestamp(last),
+                       columns=PRICE_COLUMNS)
+            df = df[~df.index.duplicated(keep='last')]
+            if last is not None:
+                df = df[df.index.asi8 > last]
+            counts[sym] = self.append(sym, df)
+        return counts
@@ -0,0 +1,387 @@
+import argparse
+import contextlib
+import copy
+import io
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy
+
+from BtAssessmentLib.BacktestModule import BTest
+from BtAssessmentLib.cache import FrameCache
+from BtAssessmentLib.main import BT
+from BtAssessmentLib.deps import DB2DF, DF2DB, EX2DB, pandas, seg_data, change_df_tf, resample_session, bb
+from BtAssessmentLib.profiling import to_json
+
+BASELINE_KEYS = ['stage', 'tickers', 'days', 'workers']
+COLD_START_MODULES = ('BtAssessmentLib', 'BtAssessmentLib.engine', 'BtAssessmentLib.sweep', 'BtAssessmentLib.main',
+                      'BtAssessmentLib.cli')
+# Stage prefix of the cold_start records, checked by regressions() with their own cold_tolerance.
+COLD_START_STAGE = 'import '
+
+
+def _best_of(fn, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def synthetic_candles(ticker, days, start='2023-01-02', seed=0, off_minute=0.2, missing=0.03):
+    """
+    Random-walk 1-minute candles of one ticker for `days` business days, 09:15 to 15:29.
+
+    Like the bundled data it has defects: a share `off_minute` of the bars starts 1-2 seconds after the minute
+    (09:16:01) and a share `missing` of the bars is dropped.
+    Returns a DataFrame indexed by CreatedOn with OpenValue, High, Low and CloseValue.
+    """
+    rng = numpy.random.default_rng([seed, sum(map(ord, ticker))])
+    session = numpy.arange(9 * 60 + 15, 15 * 60 + 30) * 60
+    dates = pandas.bdate_range(start, periods=days).asi8 // 10 ** 9
+    stamps = (dates[:, None] + session[None, :]).ravel()
+    stamps = stamps[rng.random(len(stamps)) >= missing]
+    stamps = stamps + numpy.where(rng.random(len(stamps)) < off_minute, rng.integers(1, 3, len(stamps)), 0)
+    price = rng.uniform(100, 5000)
+    close = numpy.round(price * numpy.exp(rng.normal(0, 0.0012, len(stamps)).cumsum()) / .05) * .05
+    open_ = numpy.r_[price, close[:-1]]
+    spread = numpy.round(rng.uniform(0, price * 0.001, (2, len(stamps))) / .05) * .05
+    return pandas.DataFrame({'OpenValue': open_.round(2), 'High': (numpy.maximum(open_, close) + spread[0]).round(2),
+                             'Low': (numpy.minimum(open_, close) - spread[1]).round(2), 'CloseValue': close.round(2)},
+                            index=pandas.to_datetime(stamps, unit='s').rename('CreatedOn'))
+
+
+def compare_engines(tickers, repeat=3, **btest_kwargs):
+    """
+    Benchmark the 'loop' and 'vectorized' BTest engines on the same prepared data.
+
+    Data loading is done once per ticker and excluded from the timings, only BTest.run is measured.
+    Every run starts from a fresh copy of the prepared BTest so capital changes do not leak between repeats.
+
+    Parameters:
+    -----------
+    tickers : str or list
+        Ticker symbol(s) to benchmark.
+    repeat : int (default: 3)
+        Number of timed runs per engine, the best one is reported.
+    btest_kwargs :
+        Remaining BTest arguments (start_date, end_date, bar_interval, quantity, capital, ...).
+
+    Returns : dict
+        {ticker: {'bars', 'orders', 'loop', 'vectorized', 'speedup', 'identical'}} plus a 'total' entry.
+    """
+    tickers = [tickers] if isinstance(tickers, str) else tickers
+    report = {}
+    for ticker in tickers:
+        prepared = {engine: BTest(ticker=ticker, engine=engine, **btest_kwargs) for engine in ('loop', 'vectorized')}
+        timings, books = {}, {}
+        for engine, b in prepared.items():
+            timings[engine], books[engine] = _best_of(lambda: copy.copy(b).run(), repeat)
+        report[ticker] = {'bars': len(prepared['loop'].get_df()), 'orders': len(books['loop']),
+                          'loop': timings['loop'], 'vectorized': timings['vectorized'],
+                          'speedup': timings['loop'] / timings['vectorized'],
+                          'identical': books['loop'] == books['vectorized']}
+    loop_total = sum(x['loop'] for x in report.values())
+    vec_total = sum(x['vectorized'] for x in report.values())
+    report['total'] = {'bars': sum(x['bars'] for x in report.values()),
+                       'orders': sum(x['orders'] for x in report.values()),
+                       'loop': loop_total, 'vectorized': vec_total, 'speedup': loop_total / vec_total,
+                       'identical': all(x['identical'] for x in report.values())}
+    return report
+
+
+def _legacy_load(db_name, table_name, sym, start_date, end_date):
+    # Access path before the indexed layout: full symbol scan, text timestamps, date range trimmed in pandas.
+    with sqlite3.connect(db_name) as db:
+        df = pandas.read_sql_query(f"select * from {table_name} where InstrumentIdentifier = '{sym}'", db,
+                                   index_col='CreatedOn')
+    df.index = pandas.to_datetime(df.index)
+    return df[(df.index >= start_date) & (df.index <= end_date)]
+
+
+def load_latency(db_name, tickers, start_date, end_date, table_name='minute_candle', repeat=3):
+    """
+    Per-ticker load latency of the legacy table layout versus the indexed epoch layout used by DF2DB/DB2DF.
+
+    The table in db_name is copied twice into a temporary directory, once as the old layout (text CreatedOn,
+    no index) and once through DF2DB, so both paths read exactly the same data.
+
+    Returns : pandas.DataFrame
+        One row per ticker with 'rows', 'before_ms', 'after_ms' and 'speedup'.
+    """
+    tickers = [tickers] if isinstance(tickers, str) else tickers
+    start_date, end_date = pandas.Timestamp(start_date), pandas.Timestamp(end_date)
+    use_cols = ['OpenValue', 'High', 'Low', 'CloseValue']
+    with sqlite3.connect(db_name) as db:
+        df = pandas.read_sql_query(f'select * from "{table_name}"', db)
+    df['CreatedOn'] = pandas.to_datetime(df['CreatedOn'], unit='s' if df['CreatedOn'].dtype.kind == 'i' else None)
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_db, indexed_db = os.path.join(tmp, 'legacy.db'), os.path.join(tmp, 'indexed.db')
+        with sqlite3.connect(legacy_db) as db:
+            df.to_sql(table_name, db, index=False)
+        DF2DB(df, indexed_db, table_name)
+        del df
+        for ticker in tickers:
+            before, legacy = _best_of(lambda: _legacy_load(legacy_db, table_name, ticker, start_date, end_date),
+                                      repeat)
+            after, _ = _best_of(lambda: DB2DF(indexed_db, table_name, ticker, start_date, end_date, use_cols),
+                                repeat)
+            rows.append({'ticker': ticker, 'rows': len(legacy), 'before_ms': before * 1000, 'after_ms': after * 1000,
+                         'speedup': before / after})
+    return pandas.DataFrame(rows).set_index('ticker')
+
+
+def resample_speed(n_tickers=50, days=250, intervals=(5, 15, 60), seed=0):
+    """
+    Time change_df_tf + seg_data against resample_session on synthetic 1-minute data.
+
+    Returns : pandas.DataFrame
+        One row per interval with the total seconds of both paths over all tickers, the number of bars each
+        produced and the share of the change_df_tf bars that were forward filled rather than real.
+    """
+    totals = {x: {'interval': x, 'change_df_tf_s': 0.0, 'resample_session_s': 0.0, 'change_df_tf_bars': 0,
+                  'resample_session_bars': 0} for x in intervals}
+    for i in range(n_tickers):
+        df = synthetic_candles(f'T{i}', days, seed=seed)
+        for x in intervals:
+            before, old = _best_of(lambda: seg_data(change_df_tf(df, x_minutes=x)), 1)
+            after, new = _best_of(lambda: resample_session(df, x_minutes=x), 1)
+            totals[x]['change_df_tf_s'] += before
+            totals[x]['resample_session_s'] += after
+            totals[x]['change_df_tf_bars'] += len(old)
+            totals[x]['resample_session_bars'] += len(new)
+    report = pandas.DataFrame(list(totals.values())).set_index('interval')
+    report['speedup'] = report['change_df_tf_s'] / report['resample_session_s']
+    report['synthetic_share'] = 1 - report['resample_session_bars'] / report['change_df_tf_bars']
+    return report
+
+
+def cache_startup(tickers, workers=5, **bt_kwargs):
+    """
+    Cold versus warm BT.run with a FrameCache: BT.run is timed once to fill a new cache in a temporary directory
+    and once more to read from it. Both runs must return the same results.
+
+    Returns : dict
+        {'cold_s', 'warm_s', 'speedup', 'cache_bytes', 'identical'}
+    """
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cold, first = _best_of(lambda: BT(ticker=tickers, cache_dir=cache_dir, **bt_kwargs).run(workers=workers), 1)
+        warm, second = _best_of(lambda: BT(ticker=tickers, cache_dir=cache_dir, **bt_kwargs).run(workers=workers),
+                                1)
+        cache_bytes = FrameCache(cache_dir).size()
+    return {'cold_s': cold, 'warm_s': warm, 'speedup': cold / warm, 'cache_bytes': cache_bytes,
+            'identical': all(first[t].equals(second[t]) for t in first)}
+
+
+def synthetic_universe(n_tickers, days, start='2023-01-02', seed=0, **defects):
+    """synthetic_candles of tickers T0..T{n-1} in the EX2DB layout (CreatedOn, InstrumentIdentifier, OHLC)."""
+    frames = []
+    for i in range(n_tickers):
+        df = synthetic_candles(f'T{i}', days, start=start, seed=seed, **defects).reset_index()
+        df.insert(1, 'InstrumentIdentifier', f'T{i}')
+        frames.append(df)
+    return pandas.concat(frames, ignore_index=True)
+
+
+def _record(stage, n_tickers, days, workers, bars, seconds):
+    return {'stage': stage, 'tickers': n_tickers, 'days': days, 'workers': workers, 'bars': bars,
+            'seconds': seconds, 'bars_per_sec': bars / seconds if seconds > 0 else numpy.inf}
+
+
+def stage_timings(n_tickers, days, workers=(1, 2, 4), repeat=3, seed=0, interval=5, excel_max_bars=50_000,
+                  backends=('thread', 'process')):
+    """
+    Time every stage of the pipeline on a synthetic universe of n_tickers x days 1-minute bars.
+
+    EX2DB (skipped above excel_max_bars, writing the workbook is slow), DB2DF, seg_data, change_df_tf,
+    resample_session and bb are timed over all tickers, BTest.run per engine on prepared frames and BT.run per
+    backend and worker count end to end. Every timing is the best of `repeat` runs (EX2DB runs once).
+
+    Returns : list
+        One record per stage with 'stage', 'tickers', 'days', 'workers', 'bars' (bars going into the stage),
+        'seconds' and 'bars_per_sec'.
+    """
+    universe = synthetic_universe(n_tickers, days, seed=seed)
+    tickers = sorted(universe['InstrumentIdentifier'].unique())
+    first, last = universe['CreatedOn'].min(), universe['CreatedOn'].max()
+    btest_kwargs = dict(start_date=first.strftime('%Y-%m-%d 09-15'), end_date=last.strftime('%Y-%m-%d 15-30'),
+                        bar_interval=f'{interval}min', quantity=1, capital=10 ** 9, stop_loss=.3, target=.4,
+                        change_bar_interval_at_start=True)
+    start_date = pandas.Timestamp(first.strftime('%Y-%m-%d 09:15'))
+    end_date = pandas.Timestamp(last.strftime('%Y-%m-%d 15:30'))
+    bars = len(universe)
+    records = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = os.path.join(tmp, 'bench.db')
+        if bars <= excel_max_bars:
+            xlsx = os.path.join(tmp, 'bench.xlsx')
+            universe.to_excel(xlsx, index=False)
+            with contextlib.redirect_stdout(io.StringIO()):
+                seconds, _ = _best_of(lambda: EX2DB(xlsx, db_name, 'minute_candle'), 1)
+            records.append(_record('EX2DB', n_tickers, days, 1, bars, seconds))
+        else:
+            DF2DB(universe, db_name, 'minute_candle')
+        del universe
+
+        use_cols = ['OpenValue', 'High', 'Low', 'CloseValue']
+        seconds, frames = _best_of(lambda: [DB2DF(db_name, 'minute_candle', t, start_date, end_date, use_cols)
+                                            for t in tickers], repeat)
+        records.append(_record('DB2DF', n_tickers, days, 1, bars, seconds))
+        for stage, fn in (('seg_data', seg_data), ('change_df_tf', lambda df: change_df_tf(df, x_minutes=interval)),
+                          ('resample_session', lambda df: resample_session(df, x_minutes=interval))):
+            seconds, _ = _best_of(lambda: [fn(df) for df in frames], repeat)
+            records.append(_record(stage, n_tickers, days, 1, bars, seconds))
+        resampled = [resample_session(df, x_minutes=interval) for df in frames]
+        seconds, _ = _best_of(lambda: [bb(df) for df in resampled], repeat)
+        records.append(_record('bb', n_tickers, days, 1, sum(map(len, resampled)), seconds))
+        del frames, resampled
+
+        for engine in ('loop', 'vectorized'):
+            prepared = [BTest(ticker=t, db_name=db_name, engine=engine, **btest_kwargs) for t in tickers]
+            seconds, _ = _best_of(lambda: [copy.copy(b).run() for b in prepared], repeat)
+            records.append(_record(f'BTest.run[{engine}]', n_tickers, days, 1,
+                                   sum(len(b.get_df()) for b in prepared), seconds))
+        for backend in backends:
+            for n in workers:
+                seconds, _ = _best_of(lambda: BT(ticker=tickers, db_name=db_name, **btest_kwargs)
+                                      .run(workers=n, backend=backend), repeat)
+                records.append(_record(f'BT.run[{backend}]', n_tickers, days, n, bars, seconds))
+    return records
+
+
+def cold_start(modules=COLD_START_MODULES, repeat=5):
+    """
+    Import time of every module in a fresh interpreter (best of `repeat`), as records of stage 'import <module>'
+    with bars=1, so bars_per_sec is imports per second. Import times depend on the OS file cache more than the
+    other stages, regressions() checks them against cold_tolerance.
+    """
+    # The child interpreters import this checkout of the package.
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [root, os.environ.get('PYTHONPATH')]))}
+    records = []
+    for module in modules:
+        code = f'import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)'
+        seconds = min(float(subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env,
+                                           check=True).stdout) for _ in range(repeat))
+        records.append(_record(f'import {module}', 0, 0, 1, 1, seconds))
+    return records
+
+
+def run_suite(sizes=((5, 20), (20, 60)), workers=(1, 2, 4), repeat=3, seed=0, **kwargs):
+    """cold_start plus stage_timings for every (n_tickers, days) of sizes, as one DataFrame."""
+    records = cold_start(repeat=max(repeat, 5))
+    for n_tickers, days in sizes:
+        records.extend(stage_timings(n_tickers, days, workers=workers, repeat=repeat, seed=seed, **kwargs))
+    return pandas.DataFrame(records)
+
+
+def machine_info():
+    return {'platform': platform.platform(), 'processor': platform.processor(), 'cpus': os.cpu_count(),
+            'python': platform.python_version(), 'numpy': numpy.__version__, 'pandas': pandas.__version__}
+
+
+def save_baseline(report, path):
+    """Store a run_suite report together with the machine it ran on."""
+    return to_json({'machine': machine_info(), 'results': report.to_dict('records')}, path)
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def regressions(report, baseline, tolerance=0.25, cold_tolerance=0.5):
+    """
+    Stages of report whose throughput dropped more than `tolerance` below the stored baseline, plus stages found
+    on one side only (a renamed, dropped or new stage cannot be compared and fails the check as well).
+
+    Rows are matched on stage, tickers, days and workers. cold_start rows ('import <module>') may drop by up to
+    cold_tolerance.
+    Returns : pandas.DataFrame
+        The failing rows with 'bars_per_sec', 'baseline_bars_per_sec', 'ratio' (report / baseline) and
+        'problem' ('regressed', 'missing' from report or 'not in baseline').
+    """
+    stored = pandas.DataFrame(baseline['results'])[BASELINE_KEYS + ['bars_per_sec']]
+    merged = report[BASELINE_KEYS + ['bars_per_sec']].merge(stored, on=BASELINE_KEYS, how='outer',
+                                                            suffixes=('', '_baseline'), indicator=True)
+    merged = merged.rename(columns={'bars_per_sec_baseline': 'baseline_bars_per_sec'})
+    merged['ratio'] = merged['bars_per_sec'] / merged['baseline_bars_per_sec']
+    merged['problem'] = merged['_merge'].map({'both': 'regressed', 'right_only': 'missing',
+                                              'left_only': 'not in baseline'}).astype(object)
+    allowed = numpy.where(merged['stage'].str.startswith(COLD_START_STAGE), cold_tolerance, tolerance)
+    failed = (merged['_merge'] != 'both') | (merged['ratio'] < 1 - allowed)
+    return merged[failed].drop(columns='_merge').reset_index(drop=True)
+
+
+def _fmt(x):
+    return f'{x:,.4f}' if x < 100 else f'{x:,.0f}'
+
+
+def main(argv=None):
+    """
+    Command line entry point: python -m BtAssessmentLib.bench [--baseline bench.json] [--save] ...
+
+    Prints the throughput table. With --save the results become the new baseline, otherwise they are compared
+    against it and the exit status is 1 if any stage regressed or is missing on one side, 2 if there is no
+    baseline or it was recorded on a different machine (timings of another machine are not comparable).
+    """
+    parser = argparse.ArgumentParser(prog='python -m BtAssessmentLib.bench', description=main.__doc__)
+    parser.add_argument('--sizes', default='5x20,20x60', help='comma separated TICKERSxDAYS (default: 5x20,20x60)')
+    parser.add_argument('--workers', default='1,2,4', help='worker counts for BT.run (default: 1,2,4)')
+    parser.add_argument('--backends', default='thread,process', help='BT.run backends (default: thread,process)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--interval', type=int, default=5, help='bar interval in minutes (default: 5)')
+    parser.add_argument('--baseline', default='bench_baseline.json')
+    parser.add_argument('--save', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed throughput drop (default: 0.25)')
+    parser.add_argument('--cold-tolerance', type=float, default=0.5,
+                        help='allowed drop of the cold start imports per second (default: 0.5)')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    sizes = [tuple(int(x) for x in size.split('x')) for size in args.sizes.split(',')]
+    report = run_suite(sizes, workers=[int(x) for x in args.workers.split(',')], repeat=args.repeat,
+                       seed=args.seed, interval=args.interval, backends=args.backends.split(','))
+    with pandas.option_context('display.width', 200, 'display.max_rows', None):
+        print(report.to_string(index=False, float_format=_fmt))
+    if args.json:
+        to_json(report.to_dict('records'), args.json)
+    if args.save:
+        save_baseline(report, args.baseline)
+        print(f'Baseline written to {args.baseline}')
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f'No baseline at {args.baseline}, run with --save to create one.')
+        return 2
+    baseline = load_baseline(args.baseline)
+    machine = machine_info()
+    if baseline['machine'] != machine:
+        for key in sorted(set(machine) | set(baseline['machine'])):
+            if machine.get(key) != baseline['machine'].get(key):
+                print(f"Machine mismatch: {key} is {machine.get(key)!r}, baseline {baseline['machine'].get(key)!r}")
+        print('Not comparing timings of different machines, run with --save to record a baseline here.')
+        return 2
+    regressed = regressions(report, baseline, args.tolerance, args.cold_tolerance)
+    if len(regressed):
+        print(f'{len(regressed)} stage(s) regressed by more than {args.tolerance:.0%} (imports '
+              f'{args.cold_tolerance:.0%}) or cannot be compared:')
+        print(regressed[BASELINE_KEYS + ['bars_per_sec', 'baseline_bars_per_sec', 'ratio', 'problem']]
+              .to_string(index=False, float_format=_fmt))
+        return 1
+    print('No regressions against the baseline.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
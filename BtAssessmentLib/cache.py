@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy
+
+from BtAssessmentLib.barstore import BarStore
+from BtAssessmentLib.deps import pandas, data_version
+
+CACHE_FORMAT = 1
+
+
+class FrameCache:
+    """
+    Content-addressed on-disk cache of prepared bar + indicator frames.
+
+    Every entry is a directory named after the sha256 of its key holding one .npy file per column plus the index,
+    so a hit is served as a DataFrame over memory-mapped arrays without reading the files up front.
+    Entries are written to a temporary directory and renamed into place, so concurrent writers never expose a
+    partial entry. When the cache grows beyond max_bytes the least recently used entries are evicted.
+
+    Parameters:
+    -----------
+    directory : str
+        Cache location, created if missing.
+    max_bytes : int (default: 1 GiB)
+        Size limit of all entries together.
+    """
+
+    def __init__(self, directory, max_bytes=1 << 30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(**inputs):
+        payload = json.dumps({'format': CACHE_FORMAT, **inputs}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key):
+        path = os.path.join(self.directory, key)
+        try:
+            with open(os.path.join(path, 'meta.json')) as f:
+                meta = json.load(f)
+            index = numpy.load(os.path.join(path, 'index.npy'), mmap_mode='r')
+            columns = {col: numpy.load(os.path.join(path, f'{i}.npy'), mmap_mode='r')
+                       for i, col in enumerate(meta['columns'])}
+        except (FileNotFoundError, ValueError):
+            return None
+        os.utime(os.path.join(path, 'meta.json'))
+        index = pandas.DatetimeIndex(index.view('datetime64[ns]'), name=meta['index_name'])
+        return pandas.DataFrame(columns, index=index, copy=False)
+
+    def put(self, key, df, **inputs):
+        path = os.path.join(self.directory, key)
+        if os.path.exists(path):
+            return
+        tmp = tempfile.mkdtemp(dir=self.directory, prefix='.tmp-')
+        try:
+            numpy.save(os.path.join(tmp, 'index.npy'), df.index.asi8)
+            for i, col in enumerate(df.columns):
+                numpy.save(os.path.join(tmp, f'{i}.npy'), df[col].to_numpy())
+            meta = {'columns': list(df.columns), 'index_name': df.index.name, 'inputs': inputs,
+                    'nbytes': sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp))}
+            with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+                json.dump(meta, f, default=str)
+            os.rename(tmp, path)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not os.path.exists(path):
+                raise
+        self.evict()
+
+    def entries(self):
+        """(last access, bytes, key) of every complete entry, least recently used first."""
+        result = []
+        for key in os.listdir(self.directory):
+            meta = os.path.join(self.directory, key, 'meta.json')
+            if key.startswith('.') or not os.path.exists(meta):
+                continue
+            try:
+                with open(meta) as f:
+                    nbytes = json.load(f)['nbytes']
+                result.append((os.path.getmtime(meta), nbytes, key))
+            except (FileNotFoundError, ValueError):
+                continue
+        return sorted(result)
+
+    def size(self):
+        return sum(nbytes for _, nbytes, _ in self.entries())
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(nbytes for _, nbytes, _ in entries)
+        for _, nbytes, key in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
+            total -= nbytes
+
+    def clear(self):
+        for key in os.listdir(self.directory):
+            shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
+
+
+def frame_key(db_name, table_name, ticker, start_date, end_date, timeframe, resampled, window, std, storage='sqlite',
+              bars=None):
+    """
+    Cache key inputs of a prepared BTest frame, including the version stamp of the source table (or bar file).
+    With bars (the frame given instead of the table) the version is a content hash of bars.
+    """
+    if bars is not None:
+        rows = pandas.util.hash_pandas_object(bars, index=True).to_numpy()
+        version = hashlib.sha256(json.dumps(list(bars.columns)).encode() + rows.tobytes()).hexdigest()
+    else:
+        version = BarStore(db_name).version(ticker) if storage == 'mmap' else data_version(db_name, table_name)
+    return {'db': os.path.abspath(db_name), 'table': table_name, 'storage': storage, 'version': version,
+            'ticker': ticker, 'start_date': start_date, 'end_date': end_date,
+            'timeframe': timeframe if resampled else None, 'resampler': 'session' if resampled else None,
+            'window': window, 'std': std}
@@ -0,0 +1,88 @@
+import argparse
+import json
+import sys
+
+MODES = ('run', 'run_to_disk', 'sweep', 'walk_forward')
+
+
+def load_config(path):
+    """
+    Read a JSON run configuration:
+
+        {"bt": {BT keyword arguments, ticker may be a list},
+         "strategy": {"entry": "close > bb.UB", "exit": "close < bb.UB", "indicators": {"bb": "BB(20, 1)"}},
+         "mode": "run" | "run_to_disk" | "sweep" | "walk_forward",
+         "args": {keyword arguments of the BT method of the mode, e.g. {"workers": 4, "backend": "process"}},
+         "output": "summary.csv"}
+
+    Only "bt" is required, mode defaults to 'run'. Indicators are given as calls of the rule language.
+    """
+    with open(path) as f:
+        config = json.load(f)
+    assert 'bt' in config, f"{path} has no 'bt' section with the BT arguments."
+    config.setdefault('mode', 'run')
+    config.setdefault('args', {})
+    assert config['mode'] in MODES, f"Unknown mode {config['mode']!r}. Allowed: {MODES}."
+    return config
+
+
+def build(config, profile=False):
+    """BT instance of a load_config() configuration, profiled when the configuration or `profile` asks for it."""
+    # Imported here so that --help and config errors do not pay for pandas.
+    from BtAssessmentLib.main import BT
+    from BtAssessmentLib.strategy import Strategy, compile_rule
+    kwargs = dict(config['bt'])
+    if profile:
+        kwargs['profile'] = True
+    if config.get('strategy'):
+        spec = config['strategy']
+        indicators = {name: compile_rule(call) for name, call in spec.get('indicators', {}).items()}
+        kwargs['strategy'] = Strategy(spec['entry'], spec['exit'], indicators)
+    return BT(**kwargs)
+
+
+def execute(bt, mode, args):
+    """Run mode on bt and return its result table."""
+    if mode == 'run':
+        bt.run(**args)
+        return bt.summary()
+    if mode == 'run_to_disk':
+        return bt.run_to_disk(**args).summary()
+    return getattr(bt, mode)(**args)
+
+
+def main(argv=None):
+    """
+    Command line entry point: python -m BtAssessmentLib config.json [--mode sweep] [--output table.csv]
+
+    Runs BT as described by the configuration file (see load_config) and prints the resulting table: the summary()
+    of a run or run_to_disk, the sweep() or walk_forward() table otherwise.
+    """
+    parser = argparse.ArgumentParser(prog='python -m BtAssessmentLib', description=main.__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('config', help='JSON configuration file')
+    parser.add_argument('--mode', choices=MODES, help='overrides the mode of the configuration')
+    parser.add_argument('--output', help='also write the table to this CSV file (overrides "output")')
+    parser.add_argument('--workers', type=int, help='overrides args.workers')
+    parser.add_argument('--report', help='write the profile=True report() as JSON to this file')
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    mode = args.mode or config['mode']
+    method_args = dict(config['args'])
+    if args.workers is not None:
+        method_args['workers'] = args.workers
+    # report() needs the instrumentation, turn it on rather than fail after the whole backtest.
+    bt = build(config, profile=args.report is not None)
+    table = execute(bt, mode, method_args)
+    print(table.to_string())
+    output = args.output or config.get('output')
+    if output:
+        table.to_csv(output)
+    if args.report:
+        bt.report_json(args.report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
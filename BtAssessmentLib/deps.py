@@ -1,26 +1,178 @@
+import hashlib
+import math
+import os
 import sqlite3
+import threading
 from datetime import time
+from urllib.request import pathname2url
 
+import numpy
 import pandas
 
 
+_read_only = threading.local()
+
+
 def EX2DB(filename, db_name, table_name, if_exists=None, db_index=False, index_col=None):
     if not isinstance(index_col, str):
         index_col = None
+    df = pandas.read_excel(filename, index_col=index_col)
+    DF2DB(df, db_name, table_name, if_exists=if_exists, db_index=db_index)
+    print("DB Created and data loaded successfully.")
+
+
+def DF2DB(df, db_name, table_name, if_exists=None, db_index=False):
+    """
+    Write candles to the database with CreatedOn stored as integer epoch seconds and a composite
+    (InstrumentIdentifier, CreatedOn) index, so per-ticker date range queries are index seeks.
+    Appending to a table written by older versions (CreatedOn stored as text) converts it to epoch seconds first.
+    """
     if_exists = 'replace' if if_exists is None else if_exists
+    if 'CreatedOn' in df.columns:
+        df = df.copy()
+        df['CreatedOn'] = to_epoch(pandas.to_datetime(df['CreatedOn']))
     with sqlite3.connect(db_name) as db:
-        df = pandas.read_excel(filename, index_col=index_col)
+        if if_exists == 'append':
+            to_epoch_storage(db, table_name)
         df.to_sql(table_name, db, if_exists=if_exists, index=db_index)
+        db.execute(f'create index if not exists "ix_{table_name}_sym_time" '
+                   f'on "{table_name}" (InstrumentIdentifier, CreatedOn)')
         db.commit()
-    print("DB Created and data loaded successfully.")
 
 
-def DB2DF(db_name, table_name, sym):
+def to_epoch(dt):
+    return dt.astype('int64') // 10 ** 9
+
+
+def epoch_storage(db, table_name):
+    row = db.execute(f'select typeof(CreatedOn) from "{table_name}" limit 1').fetchone()
+    return row is not None and row[0] == 'integer'
+
+
+def to_epoch_storage(db, table_name):
+    """
+    Convert the text CreatedOn values of an existing table to integer epoch seconds, so that rows appended in the
+    epoch layout do not end up next to rows of the old layout (queries pick the layout from the first row).
+    """
+    exists = db.execute("select 1 from sqlite_master where type = 'table' and name = ?", (table_name,)).fetchone()
+    if exists is None:
+        return
+    invalid = db.execute(f"select count(*) from \"{table_name}\" where typeof(CreatedOn) = 'text' "
+                         f"and strftime('%s', CreatedOn) is null").fetchone()[0]
+    if invalid:
+        raise Exception(f"Cannot append to {table_name}: {invalid} CreatedOn values are not dates.")
+    db.execute(f"update \"{table_name}\" set CreatedOn = cast(strftime('%s', CreatedOn) as integer) "
+               f"where typeof(CreatedOn) = 'text'")
+
+
+def file_fingerprint(filename, with_hash=True):
+    stat = os.stat(filename)
+    fingerprint = {'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': None}
+    if with_hash:
+        digest = hashlib.sha256()
+        with open(filename, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        fingerprint['sha256'] = digest.hexdigest()
+    return fingerprint
+
+
+def ingested_fingerprint(db_name, table_name):
+    with sqlite3.connect(db_name) as db:
+        if db.execute("select 1 from sqlite_master where type = 'table' and name = ?", (table_name,)).fetchone() is None:
+            return None
+        if db.execute("select 1 from sqlite_master where type = 'table' and name = 'ingest_log'").fetchone() is None:
+            return None
+        row = db.execute("select mtime, size, sha256 from ingest_log where table_name = ?", (table_name,)).fetchone()
+    return None if row is None else {'mtime': row[0], 'size': row[1], 'sha256': row[2]}
+
+
+def data_version(db_name, table_name):
+    """
+    Version stamp of a table: the fingerprint of the last ingested source plus the size and mtime of the database
+    file, so any write to the database yields a new stamp. None if the database does not exist (there is nothing
+    to version, callers must not cache).
+    """
+    try:
+        stat = os.stat(db_name)
+    except FileNotFoundError:
+        return None
+    stored = ingested_fingerprint(db_name, table_name)
+    return f"{stored['sha256'] if stored else ''}:{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def ingest(filename, db_name, table_name, if_exists=None):
+    """
+    Load an Excel source into the database unless this exact version of the file is already there.
+
+    The file is fingerprinted by mtime, size and sha256. When mtime and size match the fingerprint stored in the
+    ingest_log table the file is not read at all, when only the mtime changed the content hash decides.
+    Returns True if the source was (re)ingested, False if it was skipped.
+    """
+    stored = ingested_fingerprint(db_name, table_name)
+    current = file_fingerprint(filename, with_hash=False)
+    if stored is not None and stored['size'] == current['size']:
+        if stored['mtime'] == current['mtime']:
+            return False
+        current = file_fingerprint(filename)
+        if stored['sha256'] == current['sha256']:
+            return False
+    if current['sha256'] is None:
+        current = file_fingerprint(filename)
+    EX2DB(filename, db_name, table_name, if_exists=if_exists)
     with sqlite3.connect(db_name) as db:
-        df = pandas.read_sql_query(f"select * from {table_name} where InstrumentIdentifier = '{sym}'", db,
-                                   index_col='CreatedOn')
+        db.execute("create table if not exists ingest_log "
+                   "(table_name text primary key, source text, mtime integer, size integer, sha256 text)")
+        db.execute("insert or replace into ingest_log values (?, ?, ?, ?, ?)",
+                   (table_name, os.path.abspath(filename), current['mtime'], current['size'], current['sha256']))
+        db.commit()
+    return True
+
+
+def connect(db_name, read_only=False):
+    """
+    Open the database. Read-only connections are opened with SQLite's mode=ro and kept open for reuse by the
+    calling thread, so every worker process or thread has exactly one of them per database.
+    """
+    if not read_only:
+        return sqlite3.connect(db_name)
+    cache = _read_only.__dict__.setdefault('connections', {})
+    path = os.path.abspath(db_name)
+    if path not in cache:
+        cache[path] = sqlite3.connect(f'file:{pathname2url(path)}?mode=ro', uri=True)
+    return cache[path]
+
+
+def candle_query(db, table_name, sym, start_date=None, end_date=None, columns=None):
+    cols = '*' if columns is None else ', '.join(['CreatedOn'] + [f'"{c}"' for c in columns if c != 'CreatedOn'])
+    epoch = epoch_storage(db, table_name)
+    query = f'select {cols} from "{table_name}" where InstrumentIdentifier = ?'
+    params = [sym]
+    for op, bound in (('>=', start_date), ('<=', end_date)):
+        if bound is not None:
+            bound = pandas.Timestamp(bound)
+            query += f' and CreatedOn {op} ?'
+            params.append(int(bound.value // 10 ** 9) if epoch else bound.strftime('%Y-%m-%d %H:%M:%S'))
+    return query + ' order by CreatedOn', params, epoch
+
+
+def DB2DF(db_name, table_name, sym, start_date=None, end_date=None, columns=None, read_only=False,
+          storage='sqlite'):
+    """
+    Read the candles of one symbol, optionally restricted to [start_date, end_date] and to the given columns.
+
+    The symbol and the date range are bound parameters, the range is pushed into SQL so only the requested history
+    is read. Tables written by older versions (CreatedOn stored as text) are still supported.
+    With storage='mmap' db_name is a BarStore directory and the frame is a zero-copy view of its files.
+    """
+    if storage == 'mmap':
+        from BtAssessmentLib.barstore import BarStore
+        return BarStore(db_name).frame(sym, start_date, end_date, columns)
+    with connect(db_name, read_only) as db:
+        query, params, epoch = candle_query(db, table_name, sym, start_date, end_date, columns)
+        df = pandas.read_sql_query(query, db, params=params, index_col='CreatedOn')
     if len(df) > 0:
-        df.index = pandas.to_datetime(df.index)
+        df.index = pandas.to_datetime(df.index, unit='s') if epoch else pandas.to_datetime(df.index)
     return df
 
 
@@ -43,6 +195,53 @@ def change_df_tf(df, x_minutes=5):
     return returning_df
 
 
+def resample_session(df, x_minutes=5, start_h=9, start_m=15, end_h=15, end_m=30):
+    """
+    Session-aware replacement for change_df_tf.
+
+    Timestamps are floored to epoch minutes (so 09:07:01 counts as 09:07) and bucketed with integer arithmetic
+    relative to the session start of their own day, e.g. 09:15, 09:30, ... for 15-minute bars. Only buckets that
+    contain at least one bar inside the session are emitted, nothing is forward filled. Bars holds the number of
+    source bars in the bucket and Missing the number of session minutes without a bar since the previous bucket
+    of the same day, so whole buckets that are absent are flagged on the next one.
+    Works on any input that has OHLC columns and a sorted DatetimeIndex, including already resampled bars.
+    """
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index()
+    minutes = df.index.asi8 // (60 * 10 ** 9)
+    day, minute = minutes // 1440, minutes % 1440
+    start, end = start_h * 60 + start_m, end_h * 60 + end_m
+    in_session = (minute >= start) & (minute <= end)
+    columns = ['OpenValue', 'High', 'Low', 'CloseValue']
+    if not in_session.any():
+        return pandas.DataFrame(columns=columns + ['Bars', 'Missing'],
+                                index=pandas.DatetimeIndex([], name=df.index.name))
+    day, minute = day[in_session], minute[in_session]
+    o, h, l, c = (df[col].to_numpy()[in_session] for col in columns)
+    count = df['Bars'].to_numpy()[in_session] if 'Bars' in df.columns else numpy.ones(len(day), dtype='int64')
+
+    bucket = (minute - start) // x_minutes
+    key = day * 1440 + bucket
+    first = numpy.flatnonzero(numpy.r_[True, key[1:] != key[:-1]])
+    last = numpy.r_[first[1:], len(key)] - 1
+    bucket_day = day[first]
+    bucket_start = start + bucket[first] * x_minutes
+    bucket_end = numpy.minimum(bucket_start + x_minutes, end + 1)
+    new_day = numpy.r_[True, bucket_day[1:] != bucket_day[:-1]]
+    prev_end = numpy.where(new_day, start, numpy.r_[start, bucket_end[:-1]])
+    bars = numpy.add.reduceat(count, first)
+    index = pandas.to_datetime((bucket_day * 1440 + bucket_start) * 60, unit='s')
+    index.name = df.index.name
+    return pandas.DataFrame({
+        'OpenValue': o[first],
+        'High': numpy.maximum.reduceat(h, first),
+        'Low': numpy.minimum.reduceat(l, first),
+        'CloseValue': c[last],
+        'Bars': bars,
+        'Missing': numpy.maximum(bucket_end - prev_end - bars, 0),
+    }, index=index)
+
+
 def bb(df, window=20, std=1):
     curr_df = pandas.DataFrame()
     curr_df['MB'] = df['CloseValue'].rolling(window).mean().round(2).copy()
@@ -53,7 +252,104 @@ def bb(df, window=20, std=1):
     return curr_df
 
 
-def round_off_tick_size(b):
-    ty = round(b / .05)
-    amount = round(ty * .05, 4)
-    return amount
+def _round2(x):
+    # Same arithmetic as Series.round(2): scale, round half to even, unscale.
+    return x if x != x else round(x * 100) / 100
+
+
+class RollingBB:
+    """
+    Incremental Bollinger bands with O(1) work per value, equal to bb() bit for bit.
+
+    The last `window` closes are kept in a ring buffer. Mean and variance are updated with the same
+    Kahan-compensated add/remove steps that pandas' rolling mean and rolling var kernels use, and the bands
+    are rounded like bb() does.
+    """
+
+    def __init__(self, window=20, std=1):
+        self.window = window
+        self.std = std
+        self.__buffer = [math.nan] * window
+        self.__count = 0
+        self.__nobs = 0
+        self.__neg_ct = 0
+        self.__sum_x = 0.0
+        self.__mean_add = 0.0
+        self.__mean_remove = 0.0
+        self.__mean_x = 0.0
+        self.__ssqdm_x = 0.0
+        self.__var_add = 0.0
+        self.__var_remove = 0.0
+        self.__same_value = 0
+        self.__prev_value = math.nan
+
+    def __add(self, val):
+        if val != val:
+            return
+        self.__nobs += 1
+        y = val - self.__mean_add
+        t = self.__sum_x + y
+        self.__mean_add = t - self.__sum_x - y
+        self.__sum_x = t
+        if math.copysign(1.0, val) < 0:
+            self.__neg_ct += 1
+        if val == self.__prev_value:
+            self.__same_value += 1
+        else:
+            self.__same_value = 1
+        self.__prev_value = val
+        prev_mean = self.__mean_x - self.__var_add
+        y = val - self.__var_add
+        t = y - self.__mean_x
+        self.__var_add = t + self.__mean_x - y
+        self.__mean_x = self.__mean_x + t / self.__nobs
+        self.__ssqdm_x = self.__ssqdm_x + (val - prev_mean) * (val - self.__mean_x)
+
+    def __remove(self, val):
+        if val != val:
+            return
+        self.__nobs -= 1
+        y = - val - self.__mean_remove
+        t = self.__sum_x + y
+        self.__mean_remove = t - self.__sum_x - y
+        self.__sum_x = t
+        if math.copysign(1.0, val) < 0:
+            self.__neg_ct -= 1
+        if self.__nobs:
+            prev_mean = self.__mean_x - self.__var_remove
+            y = val - self.__var_remove
+            t = y - self.__mean_x
+            self.__var_remove = t + self.__mean_x - y
+            self.__mean_x = self.__mean_x - t / self.__nobs
+            self.__ssqdm_x = self.__ssqdm_x - (val - prev_mean) * (val - self.__mean_x)
+        else:
+            self.__mean_x = 0.0
+            self.__ssqdm_x = 0.0
+
+    def update(self, close):
+        """Add the next close and return (MB, UB, LB), NaN until the window is full."""
+        slot = self.__count % self.window
+        if self.__count == 0:
+            self.__prev_value = close
+            self.__same_value = 0
+        if self.__count >= self.window:
+            self.__remove(self.__buffer[slot])
+        self.__buffer[slot] = close
+        self.__count += 1
+        self.__add(close)
+        nobs = self.__nobs
+        if nobs < self.window or nobs == 0:
+            return math.nan, math.nan, math.nan
+        mean = self.__sum_x / nobs
+        if self.__same_value >= nobs:
+            mean = self.__prev_value
+        elif self.__neg_ct == 0 and mean < 0:
+            mean = 0.0
+        elif self.__neg_ct == nobs and mean > 0:
+            mean = 0.0
+        if nobs < 2:
+            return math.nan, math.nan, math.nan
+        var = 0.0 if self.__same_value >= nobs else self.__ssqdm_x / (nobs - 1)
+        mb = _round2(mean)
+        sd = _round2(math.sqrt(max(var, 0.0)) * self.std)
+        return mb, _round2(mb + sd), _round2(mb - sd)
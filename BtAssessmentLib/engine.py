@@ -0,0 +1,206 @@
+import numpy
+
+from BtAssessmentLib.orderbook import Orderbook
+
+NS_PER_MINUTE = 60 * 10 ** 9
+NS_PER_DAY = 24 * 60 * NS_PER_MINUTE
+MIS_CUTOFF = (15 * 60 + 15) * NS_PER_MINUTE
+
+
+def round_off_tick_size(b):
+    ty = round(b / .05)
+    amount = round(ty * .05, 4)
+    return amount
+
+
+def epoch_ns(index):
+    """int64 epoch nanoseconds of a DatetimeIndex, or of an array that already holds them."""
+    return index.asi8 if hasattr(index, 'asi8') else numpy.asarray(index, dtype='int64')
+
+
+def time_of_day(index):
+    """Nanoseconds since midnight for every timestamp of a DatetimeIndex (or int64 epoch nanoseconds)."""
+    ns = epoch_ns(index)
+    return ns - (ns // NS_PER_DAY) * NS_PER_DAY
+
+
+def signal_window(tod, timeframe, ordertype='CNC'):
+    """
+    Bars early enough in the day for a new signal.
+
+    The last signal time is derived exactly like BTest does it, i.e. by replacing only the hour and minute of the
+    current bar (seconds are kept) and stepping back one bar interval.
+    """
+    m = 15 if ordertype == 'MIS' else 30
+    last_sig = ((15 * 60 + m - timeframe) * NS_PER_MINUTE + tod % NS_PER_MINUTE) % NS_PER_DAY
+    return tod < last_sig
+
+
+def signal_mask(close, ub, tod, timeframe, ordertype='CNC'):
+    """Bars on which BTest.signal_statement would fire for a flat book."""
+    return (close > ub) & signal_window(tod, timeframe, ordertype)
+
+
+def entry_mask(signal, ts, tod, timeframe):
+    """Signal bars whose next bar is exactly one interval later and still inside the entry window."""
+    enter = numpy.zeros(len(signal), dtype=bool)
+    if len(signal) > 1:
+        next_ok = (numpy.diff(ts) == timeframe * NS_PER_MINUTE) & (tod[1:] < MIS_CUTOFF)
+        enter[:-1] = signal[:-1] & next_ok
+    return enter
+
+
+def bar_arrays(df):
+    """Index and price arrays of the bars BTest would act on, i.e. the rows without any NaN value."""
+    df = df[df.notna().all(axis=1)]
+    return {'index': df.index, 'open_': df['OpenValue'].to_numpy(), 'high': df['High'].to_numpy(),
+            'low': df['Low'].to_numpy(), 'close': df['CloseValue'].to_numpy(), 'ub': df['UB'].to_numpy()}
+
+
+def minute_path(df, start, end):
+    """
+    1-minute arrays for intrabar resolution: epoch minute, open, high and low of the bars of df whose minute of
+    day (timestamps floored to the minute like resample_session does) lies in [start, end] minutes.
+    """
+    minutes = df.index.asi8 // NS_PER_MINUTE
+    tod = minutes % (24 * 60)
+    keep = (tod >= start) & (tod <= end)
+    return {'minute': minutes[keep], 'open_': df['OpenValue'].to_numpy()[keep], 'high': df['High'].to_numpy()[keep],
+            'low': df['Low'].to_numpy()[keep]}
+
+
+def intrabar_arrays(index, path, timeframe):
+    """
+    simulate() intrabar argument: the minute_path arrays plus the [first, stop) rows of the 1-minute bars
+    inside every bar of index, found once with a binary search over the epoch minutes.
+    """
+    start = epoch_ns(index) // NS_PER_MINUTE
+    minute = path['minute']
+    return {**path, 'first': numpy.searchsorted(minute, start), 'stop': numpy.searchsorted(minute, start + timeframe)}
+
+
+def first_touch(intrabar, i, sl, tp, pref_sl=True):
+    """
+    'SL Hit' or 'TP Hit' for bar i on which both the stop loss and the target were touched, taken from the first
+    1-minute bar inside it touching either. If that minute touches both (or none is found) pref_sl decides.
+    """
+    first, stop = intrabar['first'][i], intrabar['stop'][i]
+    o, h, lo = intrabar['open_'][first:stop], intrabar['high'][first:stop], intrabar['low'][first:stop]
+    sl_hit = (sl <= o) | (sl <= h)
+    tp_hit = (tp >= o) | (tp >= lo)
+    touched = numpy.flatnonzero(sl_hit | tp_hit)
+    if len(touched) and sl_hit[touched[0]] != tp_hit[touched[0]]:
+        return 'SL Hit' if sl_hit[touched[0]] else 'TP Hit'
+    return 'SL Hit' if pref_sl else 'TP Hit'
+
+
+def simulate(ticker, index, open_, high, low, close, ub=None, quantity=None, capital=None, stop_loss=None,
+             target=None, timeframe=None, ordertype='CNC', pref_sl=True, signal=None, reverse=None, intrabar=None):
+    """
+    Vectorized counterpart of BTest's per-bar strategy loop.
+
+    Signal, entry, reversion and MIS square-off conditions are evaluated for all bars at once. Only the bars on
+    which a position is open are stepped through in Python, using the same SL/TP/reversion precedence as
+    BTest.__strategy, so the resulting orderbook is identical to the loop engine.
+
+    Parameters:
+    -----------
+    ticker : str
+        Symbol name written into every order.
+    index : pandas.DatetimeIndex or numpy.ndarray
+        Timestamps of the bars (or their int64 epoch nanoseconds). Bars containing NaN values must already be
+        removed.
+    open_, high, low, close, ub : numpy.ndarray
+        Price and upper Bollinger band arrays aligned with index. ub is not needed when signal and reverse
+        are given.
+    quantity, capital, stop_loss, target, timeframe, ordertype, pref_sl :
+        Same meaning as the corresponding BTest fields.
+    signal, reverse : numpy.ndarray of bool (optional)
+        Entry and exit rule per bar (see strategy.Strategy), replacing close > UB and close < UB. Session
+        timing, SL/TP and MIS square-off are applied on top exactly as for the Bollinger rules.
+    intrabar : dict (optional)
+        intrabar_arrays() of index. Bars touching both SL and TP are then resolved by first_touch() on the
+        1-minute path instead of by pref_sl alone, all other bars are handled on the coarse prices.
+
+    Returns:
+    --------
+    tuple (Orderbook, float)
+        Orderbook of the run and the capital left after the last order.
+    """
+    n = len(index)
+    orderbook = Orderbook(ticker, capital)
+    if n == 0:
+        return orderbook, capital
+    ts = epoch_ns(index)
+    tod = time_of_day(ts)
+    signal = (close > ub if signal is None else signal) & signal_window(tod, timeframe, ordertype)
+    candidates = numpy.flatnonzero(entry_mask(signal, ts, tod, timeframe))
+    reverse = (close < ub if reverse is None else reverse).tolist()
+    square_off = (tod >= MIS_CUTOFF).tolist() if ordertype == 'MIS' else [False] * n
+    o, h, lo = open_.tolist(), high.tolist(), low.tolist()
+
+    def add_order(i, ip, orderside, reason, sellprice=None, sl=None, tp=None):
+        nonlocal capital
+        if orderside == 'Short':
+            st, pnl, pnl_to_add = 'Running', 0, None
+        else:
+            st = 'Closed'
+            pnl = pnl_to_add = round((sellprice - ip) * quantity, 2)
+        capital = capital + pnl
+        orderbook.append(ts[i], ip, quantity, ip * quantity, tp, sl, orderside, st, reason, capital, pnl_to_add)
+
+    k = 0
+    while True:
+        pos = numpy.searchsorted(candidates, k)
+        j = None
+        for s in candidates[pos:].tolist():
+            if capital >= o[s + 1] * quantity:
+                j = s + 1
+                break
+        if j is None:
+            break
+
+        sellprice = o[j]
+        sl = round_off_tick_size(round(sellprice + ((sellprice * stop_loss) / 100), 4))
+        tp = round_off_tick_size(round(sellprice - ((sellprice * target) / 100), 2))
+        add_order(j, sellprice, 'Short', 'Entry', sl=sl, tp=tp)
+
+        k = None
+        reversed_ = False
+        i = j
+        while i < n:
+            if reversed_:
+                add_order(i, o[i], 'Long', 'Trend Reversed', sellprice, sl, tp)
+                k = i
+                break
+            if intrabar is not None and (sl <= o[i] or sl <= h[i]) and (tp >= o[i] or tp >= lo[i]):
+                reason = first_touch(intrabar, i, sl, tp, pref_sl)
+                add_order(i, sl if reason == 'SL Hit' else tp, 'Long', reason, sellprice, sl, tp)
+                k = i
+                break
+            if sl <= o[i] or sl <= h[i]:
+                if pref_sl:
+                    add_order(i, sl, 'Long', 'SL Hit', sellprice, sl, tp)
+                    k = i
+                    break
+                elif tp >= o[i] or tp >= lo[i]:
+                    add_order(i, tp, 'Long', 'TP Hit', sellprice, sl, tp)
+                    k = i
+                    break
+            elif tp >= o[i] or tp >= lo[i]:
+                add_order(i, tp, 'Long', 'TP Hit', sellprice, sl, tp)
+                k = i
+                break
+            if reverse[i]:
+                reversed_ = True
+            if square_off[i]:
+                add_order(i, o[i], 'Long', 'Auto SquaredOff', sellprice, sl, tp)
+                k = i + 1
+                if reversed_ and k < n:
+                    # BTest keeps its reversal flag after an MIS square off and books it on the next bar.
+                    add_order(k, o[k], 'Long', 'Trend Reversed', sellprice)
+                break
+            i += 1
+        if k is None:
+            break
+    return orderbook, capital
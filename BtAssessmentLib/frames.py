@@ -0,0 +1,74 @@
+import numpy
+
+from BtAssessmentLib.deps import pandas
+from BtAssessmentLib.orderbook import ORDER_COLUMNS, SIDES, STATUSES, REASONS, CATEGORIES
+from BtAssessmentLib.stats import Summary, SUMMARY_COLUMNS
+
+
+def to_records(orderbook, start=0, stop=None):
+    """Orders of an Orderbook as the list of dicts BTest.run has always returned (None for missing prices and PnL)."""
+    n = len(orderbook)
+    stop = n if stop is None else stop
+    cols = {col: orderbook[col][start:stop].tolist() for col in ORDER_COLUMNS if col != 'Ticker'}
+    # Balance keeps the type of the initial capital until the first PnL is booked, like BTest.add_order.
+    int_until = 0
+    if isinstance(orderbook.capital, int):
+        closes = numpy.flatnonzero(orderbook['OrderSide'][:stop] == SIDES.index('Long'))
+        int_until = closes[0] if len(closes) else stop
+    records = []
+    for i in range(stop - start):
+        tp, sl, pnl = cols['TPPrice'][i], cols['SLPrice'][i], cols['PnL'][i]
+        balance = cols['Balance'][i]
+        records.append({"Ticker": orderbook.ticker, "OrderDateTime": pandas.Timestamp(cols['OrderDateTime'][i]),
+                        "InstrumentPrice": cols['InstrumentPrice'][i], "Quantity": cols['Quantity'][i],
+                        "OrderPrice": cols['OrderPrice'][i], "TPPrice": None if tp != tp else tp,
+                        "SLPrice": None if sl != sl else sl, "OrderSide": SIDES[cols['OrderSide'][i]],
+                        "Status": STATUSES[cols['Status'][i]], "Reason": REASONS[cols['Reason'][i]],
+                        "Balance": int(balance) if start + i < int_until else balance,
+                        "PnL": None if pnl != pnl else pnl})
+    return records
+
+
+def to_frame(orderbook):
+    """
+    DataFrame with the BT.run columns over the buffers of an Orderbook, string columns as Categoricals.
+
+    copy=False keeps one block per column instead of consolidating the float columns into one 2D block, so no
+    column is copied. Operations on the frame that consolidate it (e.g. frame.copy()) do copy.
+    """
+    n = len(orderbook)
+    if n == 0:
+        return pandas.DataFrame()
+    data = {}
+    for col in ORDER_COLUMNS:
+        if col == 'Ticker':
+            data[col] = pandas.Categorical.from_codes(numpy.zeros(n, dtype='int8'), [orderbook.ticker])
+        elif col in CATEGORIES:
+            data[col] = pandas.Categorical.from_codes(orderbook[col], CATEGORIES[col])
+        elif col == 'OrderDateTime':
+            data[col] = orderbook[col].view('datetime64[ns]')
+        else:
+            data[col] = orderbook[col]
+    return pandas.DataFrame(data, copy=False)
+
+
+def to_arrow(orderbook):
+    """pyarrow.Table of an Orderbook, string columns dictionary encoded. Requires pyarrow."""
+    import pyarrow
+    return pyarrow.Table.from_pandas(to_frame(orderbook), preserve_index=False)
+
+
+def to_parquet(orderbook, path):
+    """Write an Orderbook to a Parquet file. Requires pyarrow."""
+    import pyarrow.parquet
+    pyarrow.parquet.write_table(to_arrow(orderbook), path)
+
+
+def summary_table(summaries):
+    """DataFrame with one row per {key: Summary} item plus an 'All' row merging them."""
+    total = Summary()
+    for summary in summaries.values():
+        total.merge(summary)
+    rows = [summary.result() for summary in summaries.values()] + [total.result()]
+    return pandas.DataFrame(rows, index=pandas.Index(list(summaries) + ['All'], tupleize_cols=False),
+                            columns=SUMMARY_COLUMNS)
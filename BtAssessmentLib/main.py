@@ -1,9 +1,17 @@
-from concurrent.futures import ThreadPoolExecutor
+import datetime
+import math
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from dataclasses import dataclass, field
+from functools import partial
 
-import plotly.graph_objects as go
-
-from BtAssessmentLib.BacktestModule import BTest, pandas
+from BtAssessmentLib.BacktestModule import BTest
+from BtAssessmentLib.deps import ingest, DB2DF
+from BtAssessmentLib.profiling import Profiler, NULL_PROFILER, to_json
+from BtAssessmentLib.pipeline import OrderbookSink, run_pipeline
+from BtAssessmentLib.frames import summary_table, to_frame
+from BtAssessmentLib.stats import Summary
+from BtAssessmentLib.sweep import sweep
+from BtAssessmentLib.walkforward import walk_forward
 
 
 # {"Ticker": self.ticker, "OrderDateTime": self.__curr_dt, "InstrumentPrice": ip,
@@ -28,8 +36,12 @@ class BT:
     end_date : str (yyyy-mm-dd hh-mm)
         End date and time for the backtest period.
 
-    bar_interval : str
+    bar_interval : str or list
         Bar interval for price data. Possible values: '1min', '5min', '15min', '30min', '60min'.
+        With a list (e.g. ['1min', '5min', '15min', '30min', '60min']) every ticker is read once and every
+        interval is backtested on it. Intervals are derived hierarchically (5 -> 15 -> 30 -> 60, each from the
+        largest finer interval dividing it), get their own Bollinger columns and run in parallel. results_dict,
+        df_dict and the reports are then keyed by (ticker, interval).
 
     quantity : int
         The quantity of the asset to trade on each buy/sell signal.
@@ -59,6 +71,9 @@ class BT:
             - CreatedOn column: Date format: yyyy-mm-dd hh:mm:ss
             - InstrumentIdentifier column: Ticker symbol for the asset
 
+        The file is ingested once per run, before any backtest starts, and skipped altogether
+        when the database already holds the same version of it.
+
     db_name : str (default: 'FastDb')
         Database name where the historical price data is stored.
 
@@ -72,7 +87,7 @@ class BT:
         Whether to change the bar interval at the start of the backtest.
 
     log : bool (default: False)
-        Whether to print transactions for the backtest process.
+        Whether to log the signals and transactions of every backtest (see BTest).
 
     pref_sl : bool (default: True)
         Whether to prefer stop loss over target profit.
@@ -83,13 +98,39 @@ class BT:
         CNC will be carried forward to next day
         NRML will be carried forward to next day
 
+    engine : str (default: 'loop')
+        Execution engine passed to every BTest. Possible values: 'loop', 'vectorized'.
+
+    cache_dir : str (optional)
+        FrameCache directory passed to every BTest, prepared frames are reused across runs.
+
+    cache_max_bytes : int (default: 1 GiB)
+        Size limit of cache_dir.
+
+    storage : str (default: 'sqlite')
+        'sqlite' or 'mmap' (db_name is then a BarStore directory), passed to every BTest.
+
+    strategy : strategy.Strategy (optional)
+        Entry/exit rules passed to every BTest, requires engine='vectorized'.
+
+    intrabar : bool (default: False)
+        Resolve bars touching both SL and TP on the 1-minute bars inside them (see BTest), also used by sweep().
+
+    profile : bool (default: False)
+        Collect per-stage timers and counters of every backtest, see report().
+
     Methods:
     --------
-    run(workers=5)
+    run(workers=5, backend='thread')
         - Runs the backtest. If ticker is a list, multiple backtests will be run in parallel.
         - Returns a dictionary of DataFrames with the results of each backtest.
         workers : int (default: 5)
             Number of parallel backtests to run.
+        backend : str (default: 'thread')
+            'thread' runs the tickers on a ThreadPoolExecutor and keeps every prepared frame in df_dict.
+            'process' shards the tickers across a ProcessPoolExecutor, each worker reads through its own
+            read-only SQLite connection and sends back columnar Orderbooks instead of order dicts.
+            df_dict is not filled in that mode.
         Returns : dict
             Dictionary of DataFrames with the results of each backtest.
             DataFrame's columns:
@@ -104,6 +145,61 @@ class BT:
                 - Status : str (Order status)
                 - Reason : str (Reason for order status)
                 - AmountRemaing : float (Remaining capital after the order)
+            The frames are built over each BTest's columnar Orderbook without copying it. Unlike the object
+            columns of earlier versions, Ticker, OrderSide, Status and Reason are Categoricals (compare with ==
+            or use .astype(object)) and missing TPPrice/SLPrice/PnL are NaN instead of None (use .isna()).
+            BTest.run() still returns the orders as dicts with None.
+
+    report()
+        - Instrumentation of the last profile=True run.
+        Returns : dict
+            backend, workers, wall (seconds of the whole run), cpu (CPU seconds of all tickers), stages and
+            counters summed over all tickers (ingest, load, cache, DB2DF, resample, bb, to_dict, strategy, run;
+            bars, nan_skipped, signal_bars, orders, cache_hits) and tickers with the same per ticker, including
+            its wall and CPU time. The gap between wall and cpu of a stage is time spent waiting.
+
+    report_json(path=None)
+        - report() as JSON text, also written to path when given.
+
+    run_to_disk(directory, workers=5, loaders=2, prefetch=8, format='parquet', backend='process')
+        - Runs the backtest as a pipeline for universes that do not fit in memory: `loaders` threads read and
+          prepare tickers ahead into a queue of at most `prefetch` frames, `workers` processes (or threads)
+          simulate them and every orderbook is written to directory/<ticker>.parquet (or .csv) as it completes.
+          df_dict and results_dict are not filled, memory is bounded by the queue depth.
+        Returns : pipeline.OrderbookSink
+            paths ({key: file}) and summary() of the written orderbooks.
+
+    summary()
+        - Summary metrics of the last run, computed on the orderbook arrays of every ticker.
+        Returns : DataFrame
+            One row per ticker plus an 'All' row merging them (capital summed, worst drawdown), columns
+            Trades, Wins, Losses, MaxLoss, AvgGain, AvgLoss, CumPnL, FinalBalance, MaxDrawdown, MaxDrawdownPct,
+            HoldMean, HoldMedian, HoldP90, HoldMax (holding time in minutes), one count per exit reason
+            ('SL Hit', 'TP Hit', 'Trend Reversed', 'Auto SquaredOff') and IRR (annualised).
+
+    sweep(param_grid, workers=5, aggregate=False)
+        - Evaluates every parameter combination for every ticker with the vectorized engine.
+        param_grid : dict
+            Lists of values for any of 'bar_interval', 'window', 'std', 'stop_loss', 'target'.
+            Missing keys use the BT value (window=20 and std=1 for the Bollinger bands).
+        workers : int (default: 5)
+            Number of processes evaluating SL/TP combinations, 1 runs everything in the calling process.
+        aggregate : bool (default: False)
+            Merge the summaries of all tickers per combination as they arrive, no orderbook is kept.
+        Returns : DataFrame
+            One row per (Ticker, BarInterval, Window, Std, StopLoss, Target), or per combination without
+            Ticker when aggregating, with the summary() metrics.
+
+    walk_forward(param_grid, train_days, test_days=1, step_days=None, metric='CumPnL', maximize=None, workers=5)
+        - Walk-forward validation of param_grid (same keys as sweep): every ticker is loaded and its bands are
+          computed once over the whole range, then for every fold the combination with the best `metric` over
+          train_days trading days is tested on the next test_days days, sliding by step_days (test_days).
+          Best is highest, or lowest for Losses, MaxDrawdown, MaxDrawdownPct and SL Hit; maximize=True/False
+          overrides the direction. Folds are array slices with warm bands at their boundaries and run in
+          parallel on `workers` processes.
+        Returns : DataFrame
+            One row per (Ticker, Fold) with TrainStart, TestStart, TestEnd, the chosen BarInterval, Window, Std,
+            StopLoss and Target, Train<metric> and the summary() metrics of the test days.
 
     """
 
@@ -123,35 +219,145 @@ class BT:
     log: bool = field(default=False)
     pref_sl: bool = field(default=True)
     ordertype: str = field(default='CNC')
-    df_dict = {}
-    results_dict = {}
+    engine: str = field(default='loop')
+    cache_dir: str = field(default='')
+    cache_max_bytes: int = field(default=1 << 30)
+    storage: str = field(default='sqlite')
+    strategy: object = field(default=None)
+    intrabar: bool = field(default=False)
+    profile: bool = field(default=False)
+    df_dict: dict = field(default_factory=dict, init=False, repr=False)
+    results_dict: dict = field(default_factory=dict, init=False, repr=False)
+    profile_dict: dict = field(default_factory=dict, init=False, repr=False)
+
+    __profiler = NULL_PROFILER
+    __run_info = {}
+
+    def btest_kwargs(self):
+        return dict(start_date=self.start_date, end_date=self.end_date, bar_interval=self.bar_interval,
+                    quantity=self.quantity, capital=self.capital, stop_loss=self.stop_loss, target=self.target,
+                    db_name=self.db_name, table_name=self.table_name,
+                    if_exists=self.if_exists, change_bar_interval_at_start=self.change_bar_interval_at_start,
+                    log=self.log, pref_sl=self.pref_sl, ordertype=self.ordertype, engine=self.engine,
+                    cache_dir=self.cache_dir, cache_max_bytes=self.cache_max_bytes, storage=self.storage,
+                    strategy=self.strategy, intrabar=self.intrabar, profile=self.profile)
 
     def __run(self, ticker=None):
         if ticker is None:
             ticker = self.ticker
-        b = BTest(ticker=ticker, start_date=self.start_date, end_date=self.end_date,
-                  bar_interval=self.bar_interval,
-                  quantity=self.quantity, capital=self.capital, stop_loss=self.stop_loss, target=self.target,
-                  excel_source=self.excel_source, db_name=self.db_name, table_name=self.table_name,
-                  if_exists=self.if_exists, change_bar_interval_at_start=self.change_bar_interval_at_start,
-                  log=self.log, pref_sl=self.pref_sl, ordertype=self.ordertype)
-        self.df_dict[ticker] = b.get_df()
-        return b.run()
-
-    def run(self, workers=5):
-        if isinstance(self.ticker, list):
+        return self.__run_test(ticker, BTest(ticker=ticker, **self.btest_kwargs()))
+
+    def __run_test(self, key, b):
+        self.df_dict[key] = b.get_df()
+        b.run()
+        if self.profile:
+            self.profile_dict[key] = b.profile_report()
+        return b.get_orderbook()
+
+    def __prepare_intervals(self, ticker):
+        return interval_tests(ticker, self.btest_kwargs())
+
+    def load_data(self):
+        return ingest(self.excel_source, self.db_name, self.table_name, if_exists=self.if_exists)
+
+    def run(self, workers=5, backend='thread'):
+        assert backend in ('thread', 'process'), "Backend must be either 'thread' or 'process'."
+        self.__profiler = Profiler() if self.profile else NULL_PROFILER
+        self.__run_info = {'backend': backend if isinstance(self.ticker, list) else 'single', 'workers': workers}
+        self.profile_dict = {}
+        with self.__profiler.stage('total'):
+            if self.excel_source != '':
+                with self.__profiler.stage('ingest'):
+                    self.load_data()
+            self.__run_all(workers, backend)
+        return self.results_dict
+
+    def __run_all(self, workers, backend):
+        if isinstance(self.bar_interval, list):
+            self.results_dict = self.__run_intervals(workers, backend)
+        elif isinstance(self.ticker, list) and backend == 'process':
+            self.results_dict = self.__run_processes(workers)
+        elif isinstance(self.ticker, list):
             with ThreadPoolExecutor(max_workers=workers) as executor:
                 results = executor.map(self.__run, self.ticker)
-                self.results_dict = {x: pandas.DataFrame.from_records(y) for x, y in zip(self.ticker, results)}
-                return self.results_dict
+                self.results_dict = {x: to_frame(y) for x, y in zip(self.ticker, results)}
         else:
-            results = {self.ticker: pandas.DataFrame.from_records(self.__run())}
-            return self.results_dict
+            self.results_dict = {self.ticker: to_frame(self.__run())}
+
+    def __run_intervals(self, workers, backend):
+        tickers = self.ticker if isinstance(self.ticker, list) else [self.ticker]
+        if backend == 'process':
+            return self.__run_processes(workers, tickers)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            prepared = list(executor.map(self.__prepare_intervals, tickers))
+            jobs = [((ticker, interval), b) for ticker, tests in zip(tickers, prepared)
+                    for interval, b in tests.items()]
+            del prepared
+            results = executor.map(lambda job: self.__run_test(*job), jobs)
+            return {key: to_frame(orderbook) for (key, _), orderbook in zip(jobs, results)}
+
+    def __run_processes(self, workers, tickers=None):
+        tickers = self.ticker if tickers is None else tickers
+        shard_size = max(1, math.ceil(len(tickers) / (workers * 4)))
+        shards = [tickers[i:i + shard_size] for i in range(0, len(tickers), shard_size)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(partial(_run_shard, self.btest_kwargs()), shards)
+            # map yields in submission order, so the merge does not depend on which worker finishes first.
+            results_dict = {}
+            for shard in results:
+                for key, orderbook, report in shard:
+                    results_dict[key] = to_frame(orderbook)
+                    if report is not None:
+                        self.profile_dict[key] = report
+            return results_dict
+
+    def report(self):
+        assert self.profile, "Instrumentation is off, create BT with profile=True."
+        totals = Profiler()
+        for report in self.profile_dict.values():
+            totals.merge(report)
+        own = self.__profiler.report()['stages']
+        if 'ingest' in own:
+            totals.merge({'stages': {'ingest': own['ingest']}, 'counters': {}})
+        return {**self.__run_info, 'wall': own.get('total', {}).get('wall', 0.0),
+                'cpu': sum(report['cpu'] for report in self.profile_dict.values()), **totals.report(),
+                'tickers': self.profile_dict}
+
+    def report_json(self, path=None):
+        return to_json(self.report(), path)
+
+    def run_to_disk(self, directory, workers=5, loaders=2, prefetch=8, format='parquet', backend='process'):
+        if self.excel_source != '':
+            self.load_data()
+        tickers = self.ticker if isinstance(self.ticker, list) else [self.ticker]
+        sink = run_pipeline(tickers, self.btest_kwargs(), OrderbookSink(directory, format), workers=workers,
+                            loaders=loaders, prefetch=prefetch, backend=backend)
+        self.profile_dict = sink.reports
+        return sink
+
+    def summary(self):
+        return summary_table({key: Summary().add(orderbook, self.capital)
+                              for key, orderbook in self.results_dict.items()})
+
+    def sweep(self, param_grid, workers=5, aggregate=False):
+        assert self.strategy is None, "sweep evaluates the Bollinger rules, it does not take a strategy spec."
+        if self.excel_source != '':
+            self.load_data()
+        return sweep(self.ticker, self.btest_kwargs(), param_grid, workers=workers, aggregate=aggregate)
+
+    def walk_forward(self, param_grid, train_days, test_days=1, step_days=None, metric='CumPnL', maximize=None,
+                     workers=5):
+        assert self.strategy is None, "walk_forward evaluates the Bollinger rules, it does not take a strategy spec."
+        if self.excel_source != '':
+            self.load_data()
+        return walk_forward(self.ticker, self.btest_kwargs(), param_grid, train_days, test_days=test_days,
+                            step_days=step_days, metric=metric, maximize=maximize, workers=workers)
 
     def get_df_in_dict(self):
         return self.df_dict
 
     def plot_cumpnl(self, sym_name):
+        import plotly.graph_objects as go
         equity_df = self.results_dict[sym_name].copy()
         equity_df.reset_index(inplace=True, drop=True)
         fig = go.Figure()
@@ -165,3 +371,47 @@ class BT:
                           xaxis_title='No. of Trade',
                           yaxis_title='Cumulative P&L')
         return fig
+
+
+def _minutes(interval):
+    return int(interval.lower().replace('min', ''))
+
+
+def interval_tests(ticker, btest_kwargs, read_only=False):
+    """
+    BTests of one ticker for every interval of btest_kwargs['bar_interval'], built from a single read.
+
+    The 1-minute bars are loaded once. With change_bar_interval_at_start every interval is resampled from the
+    prepared frame of the largest finer interval that divides it (1-minute bars if there is none), otherwise all
+    intervals share the 1-minute bars. Returns {interval: BTest} in ascending interval order.
+    """
+    start_date = datetime.datetime.strptime(btest_kwargs['start_date'], '%Y-%m-%d %H-%M')
+    end_date = datetime.datetime.strptime(btest_kwargs['end_date'], '%Y-%m-%d %H-%M')
+    bars = DB2DF(btest_kwargs['db_name'], btest_kwargs['table_name'], ticker, start_date=start_date,
+                 end_date=end_date, columns=['OpenValue', 'High', 'Low', 'CloseValue'], read_only=read_only,
+                 storage=btest_kwargs.get('storage', 'sqlite'))
+    tests, prepared = {}, []
+    for interval in sorted(dict.fromkeys(btest_kwargs['bar_interval']), key=_minutes):
+        minutes = _minutes(interval)
+        source = bars
+        if btest_kwargs['change_bar_interval_at_start']:
+            source = next((df for m, df in reversed(prepared) if minutes % m == 0), bars)
+        b = BTest(ticker=ticker, read_only=read_only, bars=source, minute_bars=bars,
+                  **{**btest_kwargs, 'bar_interval': interval})
+        prepared.append((minutes, b.get_df()))
+        tests[interval] = b
+    return tests
+
+
+def _run_shard(btest_kwargs, tickers):
+    orderbooks = []
+    for ticker in tickers:
+        if isinstance(btest_kwargs['bar_interval'], list):
+            tests = interval_tests(ticker, btest_kwargs, read_only=True)
+            tests = {(ticker, interval): b for interval, b in tests.items()}
+        else:
+            tests = {ticker: BTest(ticker=ticker, read_only=True, **btest_kwargs)}
+        for key, b in tests.items():
+            b.run()
+            orderbooks.append((key, b.get_orderbook(), b.profile_report() if b.profile else None))
+    return orderbooks
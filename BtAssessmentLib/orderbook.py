@@ -0,0 +1,81 @@
+import numpy
+
+ORDER_COLUMNS = ['Ticker', 'OrderDateTime', 'InstrumentPrice', 'Quantity', 'OrderPrice', 'TPPrice', 'SLPrice',
+                 'OrderSide', 'Status', 'Reason', 'Balance', 'PnL']
+SIDES = ['Short', 'Long']
+STATUSES = ['Running', 'Closed']
+REASONS = ['Entry', 'SL Hit', 'TP Hit', 'Trend Reversed', 'Auto SquaredOff']
+CATEGORIES = {'OrderSide': SIDES, 'Status': STATUSES, 'Reason': REASONS}
+DTYPES = {'OrderDateTime': 'int64', 'InstrumentPrice': 'float64', 'Quantity': 'int64', 'OrderPrice': 'float64',
+          'TPPrice': 'float64', 'SLPrice': 'float64', 'OrderSide': 'int8', 'Status': 'int8', 'Reason': 'int8',
+          'Balance': 'float64', 'PnL': 'float64'}
+_CODES = {col: {name: code for code, name in enumerate(names)} for col, names in CATEGORIES.items()}
+
+
+class Orderbook:
+    """
+    Growable struct-of-arrays orderbook of one ticker.
+
+    Every column is a preallocated NumPy array that doubles when full, OrderSide/Status/Reason are stored as
+    int8 codes into SIDES/STATUSES/REASONS and missing prices/PnL as NaN. An order costs about 60 bytes instead
+    of a 12-key dict.
+
+    Indexing with a column name returns a view of that column ('OrderSide' etc. as codes). The module only needs
+    NumPy, conversions to the BTest.run dicts, DataFrames and Parquet live in frames (to_records, to_frame,
+    to_parquet); to_frame builds the DataFrame over the same buffers without copying them. Orderbooks are mutable
+    and compared with equals(), == keeps identity semantics.
+    """
+
+    def __init__(self, ticker, capital=None, capacity=64):
+        self.ticker = ticker
+        self.capital = capital
+        self.__n = 0
+        self.__columns = {col: numpy.empty(capacity, dtype=dtype) for col, dtype in DTYPES.items()}
+
+    def __len__(self):
+        return self.__n
+
+    def append(self, ts, price, quantity, order_price, tp, sl, side, status, reason, balance, pnl):
+        """Add one order, ts is the bar timestamp in nanoseconds and tp, sl, pnl may be None."""
+        n = self.__n
+        cols = self.__columns
+        if n == len(cols['OrderDateTime']):
+            for col, values in cols.items():
+                grown = numpy.empty(max(2 * n, 64), dtype=values.dtype)
+                grown[:n] = values[:n]
+                cols[col] = grown
+        cols['OrderDateTime'][n] = ts
+        cols['InstrumentPrice'][n] = price
+        cols['Quantity'][n] = quantity
+        cols['OrderPrice'][n] = order_price
+        cols['TPPrice'][n] = numpy.nan if tp is None else tp
+        cols['SLPrice'][n] = numpy.nan if sl is None else sl
+        cols['OrderSide'][n] = _CODES['OrderSide'][side]
+        cols['Status'][n] = _CODES['Status'][status]
+        cols['Reason'][n] = _CODES['Reason'][reason]
+        cols['Balance'][n] = balance
+        cols['PnL'][n] = numpy.nan if pnl is None else pnl
+        self.__n = n + 1
+
+    def column(self, name):
+        if name == 'Ticker':
+            return numpy.full(self.__n, self.ticker, dtype=object)
+        return self.__columns[name][:self.__n]
+
+    def __getitem__(self, name):
+        return self.column(name)
+
+    def equals(self, other):
+        """True if other is an Orderbook of the same ticker with the same orders (NaN equal to NaN)."""
+        return (isinstance(other, Orderbook) and self.ticker == other.ticker and len(self) == len(other)
+                and all(numpy.array_equal(self[col], other[col], equal_nan=dtype == 'float64')
+                        for col, dtype in DTYPES.items()))
+
+    def __getstate__(self):
+        return {'ticker': self.ticker, 'capital': self.capital,
+                'columns': {col: values[:self.__n].copy() for col, values in self.__columns.items()}}
+
+    def __setstate__(self, state):
+        self.ticker, self.capital = state['ticker'], state['capital']
+        self.__columns = state['columns']
+        self.__n = len(self.__columns['OrderDateTime'])
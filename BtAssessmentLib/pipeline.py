@@ -0,0 +1,166 @@
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from BtAssessmentLib.BacktestModule import BTest
+from BtAssessmentLib.engine import simulate
+from BtAssessmentLib.profiling import Profiler, NULL_PROFILER
+from BtAssessmentLib.frames import summary_table, to_frame, to_parquet
+from BtAssessmentLib.stats import Summary
+
+_DONE = object()
+
+
+class OrderbookSink:
+    """
+    Writes every orderbook to disk as soon as it is simulated and keeps only its Summary in memory.
+
+    Files are <directory>/<ticker>.<format> (<ticker>_<interval> for multi-interval runs), written through
+    frames.to_parquet (requires pyarrow) or as CSV.
+
+    Parameters:
+    -----------
+    directory : str
+        Output location, created if missing.
+    format : str (default: 'parquet')
+        'parquet' or 'csv'.
+    """
+
+    def __init__(self, directory, format='parquet'):
+        assert format in ('parquet', 'csv'), "Format must be either 'parquet' or 'csv'."
+        self.directory = directory
+        self.format = format
+        self.paths = {}
+        self.summaries = {}
+        self.reports = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, key, orderbook, report=None):
+        name = '_'.join(key) if isinstance(key, tuple) else key
+        path = os.path.join(self.directory, f'{name}.{self.format}')
+        if self.format == 'parquet':
+            to_parquet(orderbook, path)
+        else:
+            to_frame(orderbook).to_csv(path, index=False)
+        self.paths[key] = path
+        self.summaries[key] = Summary().add(orderbook)
+        if report is not None:
+            self.reports[key] = report
+
+    def summary(self):
+        """BT.summary() table of everything written so far."""
+        return summary_table(self.summaries)
+
+
+def _prepared(ticker, btest_kwargs):
+    # Deferred import: main imports this module.
+    from BtAssessmentLib.main import interval_tests
+    if isinstance(btest_kwargs['bar_interval'], list):
+        tests = interval_tests(ticker, btest_kwargs, read_only=True)
+        return [((ticker, interval), b) for interval, b in tests.items()]
+    return [(ticker, BTest(ticker=ticker, read_only=True, **btest_kwargs))]
+
+
+def _inputs(b):
+    """(ticker, arrays, settings, report so far) of a prepared BTest, everything a simulation worker needs."""
+    with b.profiler.stage('load'):
+        arrays, settings = b.simulation_inputs()
+    return b.ticker, arrays, settings, b.profile_report() if b.profile else None
+
+
+def _simulate(ticker, arrays, settings, profile):
+    profiler = Profiler() if profile else NULL_PROFILER
+    with profiler.stage('run'):
+        with profiler.stage('strategy'):
+            orderbook, _ = simulate(ticker, **arrays, **settings)
+    profiler.count('orders', len(orderbook))
+    return orderbook, profiler.report() if profile else None
+
+
+def _merged_report(prepared, simulated):
+    # The load stages of the loader thread plus the run stage of the simulation worker.
+    if prepared is None:
+        return None
+    report = Profiler().merge(prepared).merge(simulated).report()
+    run = simulated['stages']['run']
+    return {**prepared, 'wall': prepared['wall'] + run['wall'], 'cpu': prepared['cpu'] + run['cpu'], **report}
+
+
+def run_pipeline(tickers, btest_kwargs, sink, workers=4, loaders=2, prefetch=8, backend='process'):
+    """
+    Backtest tickers as a producer/consumer pipeline and hand every orderbook to sink.write().
+
+    `loaders` threads read and prepare tickers (read-only connections, bands computed) and reduce every prepared
+    BTest to its simulation_inputs() arrays and settings, into a queue holding at most `prefetch` of them, so
+    loading the next tickers overlaps with simulating the current ones. The calling thread feeds them to
+    `workers` simulation workers (processes or threads, at most `workers` in flight) that run engine.simulate
+    (the vectorized engine, which gives the orderbooks of both engines) and passes the results to the sink as
+    they complete. Only NumPy arrays are sent to the workers, never BTests or frames. Arrays are dropped once
+    simulated, memory is bounded by prefetch + workers + loaders tickers whatever the size of the universe.
+    """
+    assert backend in ('thread', 'process'), "Backend must be either 'thread' or 'process'."
+    todo = queue.Queue()
+    for ticker in tickers:
+        todo.put(ticker)
+    work = queue.Queue(maxsize=max(1, prefetch))
+    stop = threading.Event()
+
+    def load():
+        try:
+            while not stop.is_set():
+                try:
+                    ticker = todo.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    # The BTests and their frames are dropped here, only the arrays are queued.
+                    prepared = [(key, _inputs(b)) for key, b in _prepared(ticker, btest_kwargs)]
+                except Exception as e:
+                    prepared = [(ticker, e)]
+                while prepared and not stop.is_set():
+                    try:
+                        work.put(prepared[0], timeout=0.1)
+                        del prepared[0]
+                    except queue.Full:
+                        continue
+        finally:
+            work.put(_DONE)
+
+    threads = [threading.Thread(target=load, daemon=True) for _ in range(max(1, loaders))]
+    for thread in threads:
+        thread.start()
+    executor_class = ProcessPoolExecutor if backend == 'process' else ThreadPoolExecutor
+    pending = {}
+
+    def drain(futures):
+        for future in futures:
+            key, report = pending.pop(future)
+            orderbook, simulated = future.result()
+            sink.write(key, orderbook, _merged_report(report, simulated))
+
+    try:
+        with executor_class(max_workers=workers) as executor:
+            finished = 0
+            while finished < len(threads):
+                item = work.get()
+                if item is _DONE:
+                    finished += 1
+                    continue
+                key, inputs = item
+                if isinstance(inputs, Exception):
+                    raise inputs
+                if len(pending) >= workers:
+                    drain(wait(pending, return_when=FIRST_COMPLETED).done)
+                ticker, arrays, settings, report = inputs
+                pending[executor.submit(_simulate, ticker, arrays, settings, report is not None)] = key, report
+                del item, inputs, arrays
+            drain(list(pending))
+    finally:
+        stop.set()
+        while any(thread.is_alive() for thread in threads):
+            try:
+                work.get(timeout=0.1)
+            except queue.Empty:
+                pass
+    return sink
@@ -0,0 +1,174 @@
+import heapq
+from array import array
+from dataclasses import dataclass, field
+
+import numpy
+
+from BtAssessmentLib.BacktestModule import BTest
+from BtAssessmentLib.deps import pandas
+from BtAssessmentLib.frames import to_frame
+from BtAssessmentLib.stats import xirr
+from BtAssessmentLib.stream import bar_source
+
+NS_PER_MINUTE = 60 * 10 ** 9
+
+
+@dataclass
+class Portfolio:
+    """
+    Portfolio - Capital constrained backtest of the strategy over several tickers on one timeline
+
+    Every ticker runs the BTest rules through its own BTest(stream=True), but all of them draw from a single
+    capital pool. The per-ticker bar streams are merged with a k-way heap merge, so only one pending bar per
+    ticker is held in memory and the universe is never concatenated or re-sorted.
+
+    Bars of the same minute are simultaneous. Within a minute, tickers without a pending entry are processed
+    first, so exits release capital before new entries. Entry candidates are then served in order of signal
+    strength (close / UB - 1 on the signal bar). An entry reserves OrderPrice from the pool and its exit
+    returns it together with the PnL. A signal that the free capital cannot cover is skipped like BTest does.
+
+    Parameters:
+    -----------
+    ticker : list
+        Ticker symbols that may be traded.
+
+    start_date, end_date, bar_interval, quantity, stop_loss, target, db_name, table_name,
+    change_bar_interval_at_start, pref_sl, ordertype, storage :
+        Same meaning as in BTest.
+
+    capital : float
+        Initial capital of the shared pool.
+
+    equity_freq : str (default: '1min')
+        Sampling period of equity_curve (a pandas offset such as '1min', '1h' or '1D'): the equity at the last
+        minute of every period is kept. None skips the curve, so memory no longer grows with the number of
+        minutes.
+
+    Methods:
+    --------
+    run()
+        - Runs the portfolio backtest.
+        Returns : DataFrame
+            All orders in time order with the BT.run columns. Balance is the realised capital of the pool
+            after the order and FreeCapital the part of it not reserved by open positions.
+        - Also fills equity_curve (Series of realised capital plus open PnL, see equity_freq) and cagr
+          (annualised growth rate from the initial capital to the final equity; the pool has no other external
+          cash flows, so this is also its internal rate of return).
+    """
+
+    ticker: list
+    start_date: str
+    end_date: str
+    bar_interval: str
+    quantity: int
+    capital: float
+    stop_loss: float
+    target: float
+    db_name: str = field(default='FastDb')
+    table_name: str = field(default='minute_candle')
+    change_bar_interval_at_start: bool = field(default=False)
+    pref_sl: bool = field(default=True)
+    ordertype: str = field(default='CNC')
+    storage: str = field(default='sqlite')
+    equity_freq: str = field(default='1min')
+    orderbook: object = field(default=None, init=False, repr=False)
+    equity_curve: object = field(default=None, init=False, repr=False)
+    cagr: float = field(default=None, init=False, repr=False)
+
+    def __post_init__(self):
+        assert isinstance(self.ticker, list) and len(self.ticker) > 0, "Ticker must be a non-empty list."
+
+    def __push(self, heap, i, b, bars):
+        bar = next(bars, None)
+        if bar is None:
+            return
+        strength = b.pending_signal()
+        priority = (1, -strength) if strength is not None else (0, 0.0)
+        heapq.heappush(heap, (bar[0].value // NS_PER_MINUTE, *priority, i, bar))
+
+    def run(self):
+        tests, streams, heap = [], [], []
+        for i, ticker in enumerate(self.ticker):
+            b = BTest(ticker=ticker, start_date=self.start_date, end_date=self.end_date,
+                      bar_interval=self.bar_interval, quantity=self.quantity, capital=self.capital,
+                      stop_loss=self.stop_loss, target=self.target, db_name=self.db_name,
+                      table_name=self.table_name, change_bar_interval_at_start=self.change_bar_interval_at_start,
+                      pref_sl=self.pref_sl, ordertype=self.ordertype, storage=self.storage,
+                      stream=True)
+            tests.append(b)
+            streams.append(bar_source(b))
+            self.__push(heap, i, b, streams[i])
+
+        step = None if self.equity_freq is None else pandas.Timedelta(self.equity_freq) // pandas.Timedelta('1min')
+        realised = free = self.capital
+        # open_pnl is the mark-to-market of the open positions, updated by each ticker's bars.
+        open_pnl = 0.0
+        reserved, sellprice, marks = {}, {}, {}
+        # Orders stay in the ticker's own orderbook, only their sequence and pool balances are kept here.
+        sequence, balances, free_capital = array('q'), array('d'), array('d')
+        curve_index, curve = [], []
+        first_minute = minute = None
+        while heap:
+            bar_minute, _, _, i, bar = heapq.heappop(heap)
+            if minute is None:
+                first_minute = bar_minute
+            elif bar_minute != minute and step is not None:
+                self.__sample(curve_index, curve, step, minute, realised + open_pnl)
+            minute = bar_minute
+            b = tests[i]
+            b.capital = free
+            for order in b.on_bar(*bar):
+                if order['OrderSide'] == 'Short':
+                    reserved[i] = order['OrderPrice']
+                    sellprice[i] = order['InstrumentPrice']
+                    marks[i] = 0.0
+                    free -= reserved[i]
+                else:
+                    free += reserved.pop(i, 0) + order['PnL']
+                    sellprice.pop(i, None)
+                    open_pnl -= marks.pop(i, 0.0)
+                    realised += order['PnL']
+                    if not reserved:
+                        open_pnl = 0.0
+                sequence.append(i)
+                balances.append(realised)
+                free_capital.append(free)
+            if i in reserved:
+                mark = (sellprice[i] - bar[4]) * self.quantity
+                open_pnl += mark - marks[i]
+                marks[i] = mark
+            self.__push(heap, i, b, streams[i])
+        if minute is not None and step is not None:
+            self.__sample(curve_index, curve, step, minute, realised + open_pnl)
+
+        self.orderbook = self.__orders(tests, sequence, balances, free_capital)
+        if step is not None:
+            self.equity_curve = pandas.Series(curve, index=pandas.to_datetime(curve_index, unit='m'), name='Equity')
+        if minute is not None:
+            self.cagr = xirr([-self.capital, realised + open_pnl],
+                             [pandas.Timestamp(first_minute * NS_PER_MINUTE), pandas.Timestamp(minute * NS_PER_MINUTE)])
+        return self.orderbook
+
+    @staticmethod
+    def __sample(curve_index, curve, step, minute, equity):
+        if curve_index and curve_index[-1] // step == minute // step:
+            curve_index[-1], curve[-1] = minute, equity
+        else:
+            curve_index.append(minute)
+            curve.append(equity)
+
+    @staticmethod
+    def __orders(tests, sequence, balances, free_capital):
+        """All orders in the sequence they were placed, read from the per-ticker orderbooks."""
+        if len(sequence) == 0:
+            return pandas.DataFrame()
+        sequence = numpy.frombuffer(sequence, dtype=numpy.dtype(sequence.typecode))
+        # A stable sort by ticker lines the sequence up with the concatenated per-ticker orderbooks.
+        by_ticker = numpy.argsort(sequence, kind='stable')
+        frames = [to_frame(b.get_orderbook()) for b in tests if len(b.get_orderbook()) > 0]
+        orders = pandas.concat(frames, ignore_index=True).take(numpy.argsort(by_ticker)).reset_index(drop=True)
+        for col in ('Ticker', 'OrderSide', 'Status', 'Reason'):
+            orders[col] = orders[col].astype(object)
+        orders['Balance'] = numpy.frombuffer(balances)
+        orders['FreeCapital'] = numpy.frombuffer(free_capital)
+        return orders
@@ -0,0 +1,125 @@
+import json
+import logging
+import sys
+import time
+from contextlib import nullcontext
+
+logger = logging.getLogger('BtAssessmentLib')
+
+
+class Profiler:
+    """
+    Opt-in per-stage timers and counters.
+
+    stage(name) is a context manager adding the wall time (perf_counter) and the CPU time of the calling thread
+    (thread_time) of the block to the stage, so the difference between both shows time spent waiting on I/O or
+    on other threads. count(name, n) adds to a counter. Stages may nest, each one is reported on its own.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def add(self, name, wall, cpu, calls=1):
+        stage = self.stages.setdefault(name, {'calls': 0, 'wall': 0.0, 'cpu': 0.0})
+        stage['calls'] += calls
+        stage['wall'] += wall
+        stage['cpu'] += cpu
+
+    def merge(self, report):
+        """Add the stages and counters of a report() (e.g. from another thread or process)."""
+        for name, stage in report['stages'].items():
+            self.add(name, stage['wall'], stage['cpu'], stage['calls'])
+        for name, n in report['counters'].items():
+            self.count(name, n)
+        return self
+
+    def report(self):
+        return {'stages': {name: dict(stage) for name, stage in self.stages.items()}, 'counters': dict(self.counters)}
+
+
+class _Stage:
+    __slots__ = ('profiler', 'name', 'wall', 'cpu')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.wall, self.cpu = time.perf_counter(), time.thread_time()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, time.perf_counter() - self.wall, time.thread_time() - self.cpu)
+        return False
+
+
+class NullProfiler:
+    """Stand-in used when profiling is off, every call is a no-op."""
+
+    enabled = False
+    _stage = nullcontext()
+
+    def stage(self, name):
+        return self._stage
+
+    def count(self, name, n=1):
+        pass
+
+    def report(self):
+        return {'stages': {}, 'counters': {}}
+
+
+NULL_PROFILER = NullProfiler()
+
+
+def to_json(report, path=None):
+    """Serialise a report to JSON, written to path when given."""
+    text = json.dumps(report, indent=2, default=str)
+    if path is not None:
+        with open(path, 'w') as f:
+            f.write(text)
+    return text
+
+
+class _Fields:
+    """Renders the event fields only when a handler actually formats the record."""
+    __slots__ = ('fields',)
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def __str__(self):
+        return ' '.join(f'{k}={v}' for k, v in self.fields.items())
+
+
+def log_event(event, **fields):
+    """
+    Log a structured event on the 'BtAssessmentLib' logger.
+
+    The record carries the event name and fields as record.event / record.fields for structured handlers, the
+    message is only formatted if the record is emitted.
+    """
+    if logger.isEnabledFor(logging.INFO):
+        logger.info('%s %s', event, _Fields(fields), extra={'event': event, 'fields': fields})
+
+
+def enable_logging():
+    """
+    Print events to stdout like log=True always did, unless the application configured the logger itself:
+    a logger with handlers or an explicit level is left untouched.
+    """
+    if logger.handlers or logger.level != logging.NOTSET:
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
@@ -0,0 +1,169 @@
+import datetime
+
+import numpy
+
+from BtAssessmentLib.orderbook import REASONS, SIDES
+
+SUMMARY_COLUMNS = ['Trades', 'Wins', 'Losses', 'MaxLoss', 'AvgGain', 'AvgLoss', 'CumPnL', 'FinalBalance',
+                   'MaxDrawdown', 'MaxDrawdownPct', 'HoldMean', 'HoldMedian', 'HoldP90', 'HoldMax',
+                   *REASONS[1:], 'IRR']
+NS_PER_MINUTE = 60 * 10 ** 9
+# Holding time buckets (lower edges in minutes): one per minute below HOLD_EXACT, then 16 per doubling (under
+# 4.5% wide) up to about 16 years. The last bucket is open ended.
+HOLD_EXACT = 256
+HOLD_EDGES = numpy.unique(numpy.r_[numpy.arange(HOLD_EXACT),
+                                   numpy.floor(HOLD_EXACT * 2 ** (numpy.arange(1, 241) / 16))]).astype('int64')
+
+
+def _codes(orderbook, name, categories):
+    values = orderbook[name]
+    if hasattr(values, 'cat'):
+        return values.cat.codes.to_numpy()
+    values = numpy.asarray(values)
+    if values.dtype.kind in 'iu':
+        return values
+    lookup = {c: i for i, c in enumerate(categories)}
+    return numpy.array([lookup[v] for v in values], dtype='int8')
+
+
+class Summary:
+    """
+    Mergeable summary statistics of one or more orderbooks.
+
+    add() reduces an orderbook to a handful of sums, extremes, exit reason counts and a fixed-size histogram of
+    holding times (HOLD_EDGES) in one vectorized pass, merge() combines two summaries. A Summary has the same
+    size whatever the number and length of the runs added, so aggregating thousands of runs only keeps one
+    Summary, never the orderbooks themselves. result() gives the README summary table plus drawdown,
+    holding-time distribution (minutes), exit reason breakdown and IRR. Mean and maximum holding times are
+    exact, median and 90th percentile are exact below HOLD_EXACT minutes and the lower edge of their bucket
+    above.
+    Drawdown is the worst of the added runs, IRR treats all runs as one account with their summed capital.
+    """
+
+    def __init__(self):
+        self.runs = 0
+        self.trades = self.wins = self.losses = 0
+        self.gain_sum = self.loss_sum = self.pnl_sum = 0.0
+        self.max_loss = 0.0
+        self.capital = self.final_balance = 0.0
+        self.max_drawdown = self.max_drawdown_pct = 0.0
+        self.holding = numpy.zeros(len(HOLD_EDGES), dtype='int64')
+        self.hold_sum = self.hold_max = 0
+        self.reasons = numpy.zeros(len(REASONS), dtype='int64')
+        self.first = self.last = None
+
+    def add(self, orderbook, capital=None):
+        """Add one run, given as Orderbook, BT.run DataFrame or mapping of columns with its initial capital."""
+        capital = getattr(orderbook, 'capital', None) if capital is None else capital
+        assert capital is not None, "Initial capital is needed to summarise an orderbook."
+        self.runs += 1
+        self.capital += capital
+        if len(orderbook) == 0:
+            self.final_balance += capital
+            return self
+        pnl = numpy.asarray(orderbook['PnL'], dtype=float)
+        balance = numpy.asarray(orderbook['Balance'], dtype=float)
+        ts = numpy.asarray(orderbook['OrderDateTime']).astype('datetime64[ns]').view('int64')
+        side = _codes(orderbook, 'OrderSide', SIDES)
+        reason = _codes(orderbook, 'Reason', REASONS)
+
+        closed = ~numpy.isnan(pnl)
+        pnl = pnl[closed]
+        wins, losses = pnl > 0, pnl < 0
+        self.trades += len(pnl)
+        self.wins += int(wins.sum())
+        self.losses += int(losses.sum())
+        self.gain_sum += pnl[wins].sum()
+        self.loss_sum += pnl[losses].sum()
+        self.pnl_sum += pnl.sum()
+        if losses.any():
+            self.max_loss = min(self.max_loss, pnl[losses].min())
+        self.final_balance += balance[-1]
+
+        peak = numpy.maximum.accumulate(numpy.r_[capital, balance])
+        drawdown = peak - numpy.r_[capital, balance]
+        self.max_drawdown = max(self.max_drawdown, drawdown.max())
+        self.max_drawdown_pct = max(self.max_drawdown_pct, (drawdown / peak).max() * 100)
+
+        # An exit closes the position opened by the order right before it.
+        exits = numpy.flatnonzero((side[1:] == 1) & (side[:-1] == 0)) + 1
+        minutes = (ts[exits] - ts[exits - 1]) // NS_PER_MINUTE
+        self.holding += numpy.bincount(numpy.searchsorted(HOLD_EDGES, minutes, side='right') - 1,
+                                       minlength=len(HOLD_EDGES))
+        self.hold_sum += int(minutes.sum())
+        self.hold_max = max(self.hold_max, int(minutes.max(initial=0)))
+        self.reasons += numpy.bincount(reason[closed], minlength=len(REASONS))
+
+        self.first = ts[0] if self.first is None else min(self.first, ts[0])
+        self.last = ts[-1] if self.last is None else max(self.last, ts[-1])
+        return self
+
+    def merge(self, other):
+        for attr in ('runs', 'trades', 'wins', 'losses', 'gain_sum', 'loss_sum', 'pnl_sum', 'capital',
+                     'final_balance', 'reasons', 'holding', 'hold_sum'):
+            setattr(self, attr, getattr(self, attr) + getattr(other, attr))
+        self.max_loss = min(self.max_loss, other.max_loss)
+        self.max_drawdown = max(self.max_drawdown, other.max_drawdown)
+        self.max_drawdown_pct = max(self.max_drawdown_pct, other.max_drawdown_pct)
+        self.hold_max = max(self.hold_max, other.hold_max)
+        for attr, pick in (('first', min), ('last', max)):
+            mine, theirs = getattr(self, attr), getattr(other, attr)
+            setattr(self, attr, theirs if mine is None else mine if theirs is None else pick(mine, theirs))
+        return self
+
+    def result(self):
+        held = self.holding.sum()
+        if held:
+            cumulative = numpy.cumsum(self.holding)
+            hold = {'HoldMean': self.hold_sum / held,
+                    'HoldMedian': float(HOLD_EDGES[numpy.searchsorted(cumulative, held * 0.5)]),
+                    'HoldP90': float(HOLD_EDGES[numpy.searchsorted(cumulative, held * 0.9)]),
+                    'HoldMax': float(self.hold_max)}
+        else:
+            hold = {'HoldMean': numpy.nan, 'HoldMedian': numpy.nan, 'HoldP90': numpy.nan, 'HoldMax': numpy.nan}
+        irr = numpy.nan
+        if self.first is not None and self.last > self.first:
+            start, end = (datetime.datetime(1970, 1, 1) + datetime.timedelta(microseconds=int(x) // 1000)
+                          for x in (self.first, self.last))
+            irr = xirr([-self.capital, self.final_balance], [start, end])
+        return {'Trades': self.trades, 'Wins': self.wins, 'Losses': self.losses, 'MaxLoss': self.max_loss,
+                'AvgGain': self.gain_sum / self.wins if self.wins else 0.0,
+                'AvgLoss': self.loss_sum / self.losses if self.losses else 0.0,
+                'CumPnL': self.pnl_sum, 'FinalBalance': self.final_balance,
+                'MaxDrawdown': self.max_drawdown, 'MaxDrawdownPct': self.max_drawdown_pct, **hold,
+                **{reason: int(count) for reason, count in zip(REASONS[1:], self.reasons[1:])}, 'IRR': irr}
+
+
+def summarize(orderbook, capital=None):
+    """Summary table of one orderbook, see Summary.result()."""
+    return Summary().add(orderbook, capital).result()
+
+
+def xirr(cashflows, dates, low=-0.9999, high=1e6, tol=1e-10):
+    """
+    Annualised internal rate of return of dated cash flows (negative = invested, positive = returned).
+
+    Solved by bisection on the NPV with 365-day years, returns NaN if the flows do not change sign.
+    """
+    flows = numpy.asarray(cashflows, dtype=float)
+    if not ((flows < 0).any() and (flows > 0).any()):
+        return numpy.nan
+    t0 = min(dates)
+    years = numpy.array([(d - t0) / datetime.timedelta(days=365) for d in dates])
+
+    def npv(rate):
+        return (flows / (1 + rate) ** years).sum()
+
+    f_low = npv(low)
+    if f_low * npv(high) > 0:
+        return numpy.nan
+    for _ in range(300):
+        mid = (low + high) / 2
+        f_mid = npv(mid)
+        if abs(f_mid) < tol or high - low < tol:
+            break
+        if f_low * f_mid < 0:
+            high = mid
+        else:
+            low, f_low = mid, f_mid
+    return mid
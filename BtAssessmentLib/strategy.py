@@ -0,0 +1,383 @@
+import ast
+
+import numpy
+
+from BtAssessmentLib.deps import bb, pandas
+
+PRICE_COLUMNS = {'open': 'OpenValue', 'high': 'High', 'low': 'Low', 'close': 'CloseValue'}
+
+
+class FrameContext:
+    """
+    Evaluation context of one bar frame.
+
+    Indicator results are memoized on their parameters, so every rule and every strategy evaluated through the
+    same context computes a shared indicator (e.g. BB(20, 1) used by entry and exit) only once.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self.memo = {}
+
+    def column(self, name):
+        return self.df[PRICE_COLUMNS.get(name, name)].to_numpy()
+
+    def indicator(self, indicator):
+        key = indicator.key()
+        if key not in self.memo:
+            self.memo[key] = indicator.compute(self)
+        return self.memo[key]
+
+
+class Expr:
+    """Node of a rule expression. Operators build new nodes, evaluate(ctx) returns a NumPy array."""
+
+    def evaluate(self, ctx):
+        raise NotImplementedError
+
+    def indicators(self):
+        return [indicator for child in self.children() for indicator in child.indicators()]
+
+    def columns(self):
+        """Names of the frame columns read by the expression, including the sources of its indicators."""
+        return [name for child in self.children() for name in child.columns()]
+
+    def children(self):
+        return []
+
+    def shift(self, periods=1):
+        return Op('shift', self, Const(periods))
+
+    def __gt__(self, other):
+        return Op('>', self, other)
+
+    def __ge__(self, other):
+        return Op('>=', self, other)
+
+    def __lt__(self, other):
+        return Op('<', self, other)
+
+    def __le__(self, other):
+        return Op('<=', self, other)
+
+    def __and__(self, other):
+        return Op('&', self, other)
+
+    def __or__(self, other):
+        return Op('|', self, other)
+
+    def __invert__(self):
+        return Op('~', self)
+
+    def __add__(self, other):
+        return Op('+', self, other)
+
+    def __sub__(self, other):
+        return Op('-', self, other)
+
+    def __mul__(self, other):
+        return Op('*', self, other)
+
+    def __truediv__(self, other):
+        return Op('/', self, other)
+
+    def __neg__(self):
+        return Op('neg', self)
+
+
+class Const(Expr):
+    def __init__(self, value):
+        self.value = value
+
+    def evaluate(self, ctx):
+        return self.value
+
+    def __repr__(self):
+        return repr(self.value)
+
+
+class Column(Expr):
+    """Frame column, 'open', 'high', 'low' and 'close' map to the OHLC columns."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def evaluate(self, ctx):
+        return ctx.column(self.name)
+
+    def columns(self):
+        return [self.name]
+
+    def __repr__(self):
+        return self.name
+
+
+def _shift(values, periods):
+    values = numpy.asarray(values, dtype=float)
+    shifted = numpy.full(len(values), numpy.nan)
+    if periods >= 0:
+        shifted[periods:] = values[:len(values) - periods]
+    else:
+        shifted[:periods] = values[-periods:]
+    return shifted
+
+
+_OPS = {'>': numpy.greater, '>=': numpy.greater_equal, '<': numpy.less, '<=': numpy.less_equal,
+        '&': numpy.logical_and, '|': numpy.logical_or, '~': numpy.logical_not, '+': numpy.add,
+        '-': numpy.subtract, '*': numpy.multiply, '/': numpy.divide, 'neg': numpy.negative, 'abs': numpy.abs,
+        'shift': _shift}
+
+
+class Op(Expr):
+    def __init__(self, op, *args):
+        self.op = op
+        self.args = [arg if isinstance(arg, Expr) else Const(arg) for arg in args]
+
+    def children(self):
+        return self.args
+
+    def evaluate(self, ctx):
+        return _OPS[self.op](*(arg.evaluate(ctx) for arg in self.args))
+
+    def __repr__(self):
+        if len(self.args) == 2 and self.op != 'shift':
+            return f'({self.args[0]!r} {self.op} {self.args[1]!r})'
+        return f"{self.op}({', '.join(map(repr, self.args))})"
+
+
+def cross_above(a, b):
+    """a closes above b on this bar after being at or below it on the previous bar."""
+    return (a > b) & (Op('shift', a, 1) <= Op('shift', b, 1))
+
+
+def cross_below(a, b):
+    return (a < b) & (Op('shift', a, 1) >= Op('shift', b, 1))
+
+
+class Indicator(Expr):
+    """
+    Base class of the indicators. compute(ctx) returns one array, or a dict of arrays for indicators with
+    several outputs which are then referenced as attributes (BB(20, 1).UB).
+    """
+
+    outputs = ()
+
+    def key(self):
+        return (type(self).__name__, tuple(sorted(vars(self).items())))
+
+    def compute(self, ctx):
+        raise NotImplementedError
+
+    def indicators(self):
+        return [self]
+
+    def columns(self):
+        return [self.source] if 'source' in vars(self) else list(PRICE_COLUMNS)
+
+    def evaluate(self, ctx):
+        assert not self.outputs, f"{self!r} has several outputs, use one of {self.outputs}."
+        return ctx.indicator(self)
+
+    def __getattr__(self, name):
+        if name in type(self).outputs:
+            return Output(self, name)
+        raise AttributeError(name)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{k}={v!r}' for k, v in vars(self).items())})"
+
+
+class Output(Expr):
+    def __init__(self, indicator, name):
+        self.indicator = indicator
+        self.name = name
+
+    def indicators(self):
+        return [self.indicator]
+
+    def columns(self):
+        return self.indicator.columns()
+
+    def evaluate(self, ctx):
+        return ctx.indicator(self.indicator)[self.name]
+
+    def __repr__(self):
+        return f'{self.indicator!r}.{self.name}'
+
+
+class BB(Indicator):
+    """Bollinger bands exactly as bb() computes them, outputs MB, UB and LB."""
+
+    outputs = ('MB', 'UB', 'LB')
+
+    def __init__(self, window=20, std=1):
+        self.window = window
+        self.std = std
+
+    def compute(self, ctx):
+        bands = bb(ctx.df, window=self.window, std=self.std)
+        return {col: bands[col].to_numpy() for col in self.outputs}
+
+
+class SMA(Indicator):
+    def __init__(self, window=20, source='close'):
+        self.window = window
+        self.source = source
+
+    def compute(self, ctx):
+        return pandas.Series(ctx.column(self.source)).rolling(self.window).mean().to_numpy()
+
+
+class EMA(Indicator):
+    """Exponential moving average with span `window`, NaN until `window` values were seen."""
+
+    def __init__(self, window=20, source='close'):
+        self.window = window
+        self.source = source
+
+    def compute(self, ctx):
+        series = pandas.Series(ctx.column(self.source))
+        return series.ewm(span=self.window, adjust=False, min_periods=self.window).mean().to_numpy()
+
+
+class RSI(Indicator):
+    """Wilder's relative strength index (0-100) of the closes."""
+
+    def __init__(self, window=14, source='close'):
+        self.window = window
+        self.source = source
+
+    def compute(self, ctx):
+        change = pandas.Series(ctx.column(self.source)).diff()
+        smooth = dict(alpha=1 / self.window, adjust=False, min_periods=self.window)
+        gain = change.clip(lower=0).ewm(**smooth).mean()
+        loss = (-change.clip(upper=0)).ewm(**smooth).mean()
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            return (100 - 100 / (1 + gain / loss)).to_numpy()
+
+
+INDICATORS = {'BB': BB, 'SMA': SMA, 'EMA': EMA, 'RSI': RSI}
+FUNCTIONS = {'cross_above': cross_above, 'cross_below': cross_below, 'abs': lambda a: Op('abs', a),
+             'shift': lambda a, periods=1: Op('shift', a, periods)}
+_BINARY = {ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/', ast.BitAnd: '&', ast.BitOr: '|'}
+_COMPARE = {ast.Gt: '>', ast.GtE: '>=', ast.Lt: '<', ast.LtE: '<='}
+
+
+def compile_rule(rule, names=None):
+    """
+    Compile a rule string such as 'close > bb.UB and RSI(14) > 70' into an expression.
+
+    Allowed are numbers, frame columns (open, high, low, close or any column name), the names of the strategy's
+    indicators, indicator calls (BB, SMA, EMA, RSI), cross_above, cross_below, shift, abs, arithmetic,
+    comparisons (also chained), and/or/not and &/|/~. Anything else raises an Exception.
+    """
+    if isinstance(rule, Expr):
+        return rule
+    names = names or {}
+
+    def build(node):
+        if isinstance(node, ast.Expression):
+            return build(node.body)
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return Const(node.value)
+        if isinstance(node, ast.Name):
+            return names[node.id] if node.id in names else Column(node.id)
+        if isinstance(node, ast.Attribute):
+            value = build(node.value)
+            if not isinstance(value, Indicator) or node.attr not in value.outputs:
+                raise Exception(f"Unknown attribute {value!r}.{node.attr} in rule {rule!r}, only the outputs of "
+                                f"indicators with several outputs (e.g. bb.UB) can be referenced.")
+            return getattr(value, node.attr)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+            args = [arg.value if isinstance(arg, ast.Constant) else build(arg) for arg in node.args]
+            kwargs = {kw.arg: kw.value.value if isinstance(kw.value, ast.Constant) else build(kw.value)
+                      for kw in node.keywords}
+            if node.func.id in INDICATORS:
+                return INDICATORS[node.func.id](*args, **kwargs)
+            if node.func.id in FUNCTIONS:
+                return FUNCTIONS[node.func.id](*args, **kwargs)
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY:
+            return Op(_BINARY[type(node.op)], build(node.left), build(node.right))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.Invert)):
+            return ~build(node.operand)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            return -build(node.operand)
+        if isinstance(node, ast.BoolOp):
+            values = [build(value) for value in node.values]
+            op = '&' if isinstance(node.op, ast.And) else '|'
+            result = values[0]
+            for value in values[1:]:
+                result = Op(op, result, value)
+            return result
+        if isinstance(node, ast.Compare) and all(type(op) in _COMPARE for op in node.ops):
+            operands = [build(node.left)] + [build(c) for c in node.comparators]
+            result = None
+            for op, left, right in zip(node.ops, operands, operands[1:]):
+                term = Op(_COMPARE[type(op)], left, right)
+                result = term if result is None else result & term
+            return result
+        raise Exception(f"Unsupported expression in rule {rule!r}: {ast.dump(node)}")
+
+    return build(ast.parse(rule, mode='eval'))
+
+
+class Strategy:
+    """
+    Declarative short-side strategy: named indicators plus entry and exit rules.
+
+    The entry rule replaces close > UB (a short is opened on the open of the next bar) and the exit rule
+    replaces close < UB (the position is closed on the open of the next bar). SL/TP, session timing and MIS
+    square-off stay as in BTest. Rules are strings (see compile_rule) or expressions built from Column,
+    indicators and operators, both compile to vectorized NumPy operations over the whole frame.
+
+    Parameters:
+    -----------
+    entry : str or Expr
+        Rule that signals a short entry.
+    exit : str or Expr
+        Rule that closes the open position.
+    indicators : dict (optional)
+        Names usable in the rules, e.g. {'bb': BB(20, 1), 'rsi': RSI(14)}.
+
+    Example:
+    --------
+    Strategy(entry='close > bb.UB and rsi > 70', exit='close < bb.MB', indicators={'bb': BB(20, 2), 'rsi': RSI(14)})
+    """
+
+    def __init__(self, entry, exit, indicators=None):
+        self.indicators = dict(indicators or {})
+        self.entry = compile_rule(entry, self.indicators)
+        self.exit = compile_rule(exit, self.indicators)
+
+    def __repr__(self):
+        return f'Strategy(entry={self.entry!r}, exit={self.exit!r})'
+
+    def masks(self, df, ctx=None):
+        """
+        (entry, exit, valid) boolean arrays over the rows of df, valid = no NaN in OHLC or any indicator used.
+        Raises an Exception naming the rule if a rule reads a column df does not have (e.g. a misspelt indicator).
+        """
+        for label, rule in (('entry', self.entry), ('exit', self.exit)):
+            missing = sorted({name for name in rule.columns() if PRICE_COLUMNS.get(name, name) not in df.columns})
+            if missing:
+                raise Exception(f"The {label} rule {rule!r} uses {missing}, which are neither indicators of the "
+                                f"strategy ({sorted(self.indicators)}) nor columns of the bars.")
+        ctx = FrameContext(df) if ctx is None else ctx
+        valid = df[list(PRICE_COLUMNS.values())].notna().all(axis=1).to_numpy()
+        for indicator in self.entry.indicators() + self.exit.indicators():
+            values = ctx.indicator(indicator)
+            for column in (values.values() if isinstance(values, dict) else [values]):
+                valid &= ~numpy.isnan(column)
+        return numpy.asarray(self.entry.evaluate(ctx), dtype=bool), numpy.asarray(self.exit.evaluate(ctx),
+                                                                                   dtype=bool), valid
+
+    def arrays(self, df, ctx=None):
+        """simulate() keyword arrays of the valid bars of df, with the rules as signal and reverse."""
+        entry, exit_, valid = self.masks(df, ctx)
+        bars = df[valid]
+        return {'index': bars.index, 'open_': bars['OpenValue'].to_numpy(), 'high': bars['High'].to_numpy(),
+                'low': bars['Low'].to_numpy(), 'close': bars['CloseValue'].to_numpy(), 'signal': entry[valid],
+                'reverse': exit_[valid]}
+
+
+BOLLINGER_REVERSION = Strategy(entry='close > bb.UB', exit='close < bb.UB', indicators={'bb': BB(20, 1)})
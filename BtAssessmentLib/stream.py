@@ -0,0 +1,71 @@
+import datetime
+
+from BtAssessmentLib.barstore import BarStore
+from BtAssessmentLib.deps import connect, candle_query, pandas
+
+
+def db_bars(db_name, table_name, sym, start_date=None, end_date=None, read_only=False, storage='sqlite'):
+    """Yield (ts, open, high, low, close) of one symbol from a SQLite cursor or the bar store, oldest first."""
+    if storage == 'mmap':
+        views = BarStore(db_name).read(sym, start_date, end_date)
+        for created_on, o, h, l, c in zip(views['CreatedOn'], views['OpenValue'], views['High'], views['Low'],
+                                          views['CloseValue']):
+            yield pandas.Timestamp(int(created_on)), float(o), float(h), float(l), float(c)
+        return
+    with connect(db_name, read_only) as db:
+        query, params, epoch = candle_query(db, table_name, sym, start_date, end_date,
+                                            ['OpenValue', 'High', 'Low', 'CloseValue'])
+        for created_on, o, h, l, c in db.execute(query, params):
+            ts = pandas.Timestamp(created_on, unit='s') if epoch else pandas.Timestamp(created_on)
+            yield ts, o, h, l, c
+
+
+def resample_bars(bars, x_minutes, start_h=9, start_m=15, end_h=15, end_m=30):
+    """
+    Incremental equivalent of resample_session for a bar stream.
+
+    Bars outside the session are dropped, the others are bucketed on epoch minutes anchored to the session start
+    and a bucket is emitted as soon as the first bar of the next bucket arrives.
+    """
+    start, end = start_h * 60 + start_m, end_h * 60 + end_m
+    key = last = None
+    for ts, o, h, l, c in bars:
+        minutes = ts.value // (60 * 10 ** 9)
+        day, minute = divmod(minutes, 1440)
+        if not start <= minute <= end:
+            continue
+        k = (day, start + (minute - start) // x_minutes * x_minutes)
+        if k == key:
+            last = [last[0], max(last[1], h), min(last[2], l), c]
+            continue
+        if key is not None:
+            yield (pandas.Timestamp((key[0] * 1440 + key[1]) * 60, unit='s'), *last)
+        key, last = k, [o, h, l, c]
+    if key is not None:
+        yield (pandas.Timestamp((key[0] * 1440 + key[1]) * 60, unit='s'), *last)
+
+
+def bar_source(b, read_only=False):
+    """
+    Lazy bar stream for a BTest(stream=True): rows are fetched from a cursor over the same date range run() would
+    read and are resampled on the fly when change_bar_interval_at_start is set.
+    """
+    start_date = datetime.datetime.strptime(b.start_date, '%Y-%m-%d %H-%M')
+    end_date = datetime.datetime.strptime(b.end_date, '%Y-%m-%d %H-%M')
+    bars = db_bars(b.db_name, b.table_name, b.ticker, start_date, end_date, read_only=read_only, storage=b.storage)
+    if b.change_bar_interval_at_start:
+        bars = resample_bars(bars, int(b.bar_interval.lower().replace('min', '')), start_h=start_date.hour,
+                             start_m=start_date.minute, end_h=end_date.hour, end_m=end_date.minute)
+    return bars
+
+
+def replay(b, read_only=False):
+    """
+    Stream the candles of a BTest(stream=True) from its database through BTest.on_bar.
+
+    Returns the orderbook, which is identical to BTest.run() for the same parameters.
+    """
+    orderbook = []
+    for bar in bar_source(b, read_only=read_only):
+        orderbook.extend(b.on_bar(*bar))
+    return orderbook
@@ -0,0 +1,122 @@
+import datetime
+import itertools
+import math
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from BtAssessmentLib.deps import DB2DF, seg_data, resample_session, bb, pandas
+from BtAssessmentLib.engine import bar_arrays, minute_path, intrabar_arrays
+from BtAssessmentLib.workers import evaluate
+
+GRID_KEYS = ('bar_interval', 'window', 'std', 'stop_loss', 'target')
+
+
+def expand_grid(param_grid, settings):
+    """Fill missing grid keys with the BT settings (window=20, std=1 for the bands) and wrap scalars in lists."""
+    defaults = {'bar_interval': settings['bar_interval'], 'window': 20, 'std': 1,
+                'stop_loss': settings['stop_loss'], 'target': settings['target']}
+    unknown = set(param_grid) - set(GRID_KEYS)
+    assert not unknown, f"Unknown sweep parameters: {sorted(unknown)}. Allowed: {GRID_KEYS}."
+    grid = {}
+    for key in GRID_KEYS:
+        values = param_grid.get(key, defaults[key])
+        grid[key] = list(values) if isinstance(values, (list, tuple, set, range)) else [values]
+    return grid
+
+
+def prepared_groups(ticker, settings, grid):
+    """
+    Yield (group, arrays) for every (bar_interval, window, std) of one ticker.
+
+    The ticker is read from the database once, resampled frames are cached per interval and Bollinger bands per
+    (interval, window, std), so every SL/TP combination of a group shares the same arrays. The bar timestamps are
+    passed as int64 nanoseconds: workers.evaluate() then only needs NumPy.
+    """
+    start_date = datetime.datetime.strptime(settings['start_date'], '%Y-%m-%d %H-%M')
+    end_date = datetime.datetime.strptime(settings['end_date'], '%Y-%m-%d %H-%M')
+    df = DB2DF(settings['db_name'], settings['table_name'], ticker, start_date=start_date, end_date=end_date,
+               columns=['OpenValue', 'High', 'Low', 'CloseValue'], storage=settings.get('storage', 'sqlite'))
+    if len(df) == 0:
+        raise Exception(f"No data found in database for {ticker}. Perhaps wrong symbol or date?")
+    resampled = {}
+    path = minute_path(df, start_date.hour * 60 + start_date.minute, end_date.hour * 60 + end_date.minute) \
+        if settings.get('intrabar') and settings['change_bar_interval_at_start'] else None
+    for bar_interval in grid['bar_interval']:
+        timeframe = int(bar_interval.lower().replace('min', ''))
+        key = timeframe if settings['change_bar_interval_at_start'] else None
+        if key not in resampled:
+            session = dict(start_h=start_date.hour, start_m=start_date.minute, end_h=end_date.hour,
+                           end_m=end_date.minute)
+            resampled[key] = resample_session(df, x_minutes=timeframe, **session) if key is not None else \
+                seg_data(df, **session)
+        for window, std in itertools.product(grid['window'], grid['std']):
+            bars = resampled[key]
+            arrays = bar_arrays(pandas.concat([bars, bb(bars, window=window, std=std)], axis=1))
+            if path is not None:
+                arrays['intrabar'] = intrabar_arrays(arrays['index'], path, timeframe)
+            arrays['index'] = arrays['index'].asi8
+            yield {'Ticker': ticker, 'BarInterval': bar_interval, 'Timeframe': timeframe, 'Window': window,
+                   'Std': std}, arrays
+
+
+def ordered_map(executor, fn, tasks, in_flight):
+    """
+    Yield fn(*task) for every task of the iterable in task order, with at most in_flight tasks submitted and not
+    finished. Results that finish early wait in a reorder buffer keyed by submission index until all earlier ones
+    are yielded, so merging them does not depend on worker timing. Futures are dropped as soon as they finish.
+    """
+    pending, finished, next_index = {}, {}, 0
+
+    def completed(return_when):
+        nonlocal next_index
+        done, _ = wait(pending, return_when=return_when)
+        for future in done:
+            finished[pending.pop(future)] = future.result()
+        while next_index in finished:
+            yield finished.pop(next_index)
+            next_index += 1
+
+    for index, task in enumerate(tasks):
+        if len(pending) >= in_flight:
+            yield from completed(FIRST_COMPLETED)
+        pending[executor.submit(fn, *task)] = index
+    while pending:
+        yield from completed(FIRST_COMPLETED)
+
+
+def sweep(tickers, settings, param_grid, workers=5, aggregate=False):
+    """
+    Evaluate every combination of param_grid for every ticker and return one summary row per combination.
+
+    Data loading, resampling and band computation happen once per ticker/interval/band in this process, the
+    SL/TP combinations of each group are split into chunks and simulated in parallel on a ProcessPoolExecutor.
+    At most 2 * workers chunks are in flight, so memory does not grow with the size of the universe.
+    With aggregate=True the Summary of every combination is merged across tickers as results arrive and one row
+    per combination (without Ticker) is returned.
+    """
+    tickers = [tickers] if isinstance(tickers, str) else tickers
+    grid = expand_grid(param_grid, settings)
+    combos = list(itertools.product(grid['stop_loss'], grid['target']))
+    groups = (item for ticker in tickers for item in prepared_groups(ticker, settings, grid))
+    collected = {}
+
+    def collect(results):
+        for params, summary in results:
+            if aggregate:
+                params = {k: v for k, v in params.items() if k != 'Ticker'}
+            key = tuple(params.items())
+            if key in collected:
+                collected[key].merge(summary)
+            else:
+                collected[key] = summary
+
+    if workers is None or workers <= 1:
+        for group, arrays in groups:
+            collect(evaluate(group, arrays, combos, settings))
+    else:
+        chunk = max(1, math.ceil(len(combos) / workers))
+        tasks = ((group, arrays, combos[i:i + chunk], settings)
+                 for group, arrays in groups for i in range(0, len(combos), chunk))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for results in ordered_map(executor, evaluate, tasks, 2 * workers):
+                collect(results)
+    return pandas.DataFrame([{**dict(key), **summary.result()} for key, summary in collected.items()])
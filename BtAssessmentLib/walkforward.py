@@ -0,0 +1,86 @@
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+
+from BtAssessmentLib.deps import pandas
+from BtAssessmentLib.engine import NS_PER_DAY, epoch_ns
+from BtAssessmentLib.stats import SUMMARY_COLUMNS
+from BtAssessmentLib.sweep import expand_grid, prepared_groups, ordered_map
+from BtAssessmentLib.workers import slice_arrays, evaluate_fold
+
+# Summary columns where the smaller value is the better one, used to pick the direction of a metric.
+LOWER_IS_BETTER = ('Losses', 'MaxDrawdown', 'MaxDrawdownPct', 'SL Hit')
+
+
+def fold_bounds(days, train_days, test_days=1, step_days=None):
+    """
+    (train_start, test_start, test_stop) epoch nanoseconds of every fold over the sorted trading days (epoch
+    days): train on train_days days, test on the next test_days days, then slide by step_days (test_days).
+    """
+    assert train_days > 0 and test_days > 0, "train_days and test_days must be positive."
+    step_days = test_days if step_days is None else step_days
+    assert step_days > 0, "step_days must be positive."
+    starts = numpy.asarray(days, dtype='int64') * NS_PER_DAY
+    folds = []
+    for first in range(0, len(starts) - train_days - test_days + 1, step_days):
+        test, stop = first + train_days, first + train_days + test_days
+        folds.append((int(starts[first]), int(starts[test]),
+                      int(starts[stop]) if stop < len(starts) else int(starts[-1]) + NS_PER_DAY))
+    return folds
+
+
+def walk_forward(tickers, settings, param_grid, train_days, test_days=1, step_days=None, metric='CumPnL',
+                 maximize=None, workers=5):
+    """
+    Walk-forward evaluation of param_grid (see sweep.expand_grid) for every ticker.
+
+    Every ticker is read once and resampled / banded once per (bar_interval, window, std) over the full range,
+    so indicators are warm at every fold boundary instead of losing their first window - 1 bars per fold. Folds
+    are cut from these arrays by binary search as views (see slice_arrays). For every fold the SL/TP grid is
+    trained on train_days trading days and the combination with the best `metric` is tested on the following
+    test_days days, folds slide by step_days. The best value is the highest unless the metric is in
+    LOWER_IS_BETTER (drawdowns, losses, stop loss hits), maximize overrides the direction. Each fold starts flat
+    with the full capital. Folds run in parallel on a ProcessPoolExecutor (only the bars of the fold are sent to
+    the worker), at most 2 * workers in flight.
+
+    Returns one row per (ticker, fold): Ticker, Fold, TrainStart, TestStart, TestEnd (exclusive), the chosen
+    parameters, Train<metric> and the Summary columns of the test days.
+    """
+    assert metric in SUMMARY_COLUMNS, f"Unknown metric {metric!r}. Allowed: {SUMMARY_COLUMNS}."
+    maximize = metric not in LOWER_IS_BETTER if maximize is None else maximize
+    tickers = [tickers] if isinstance(tickers, str) else tickers
+    grid = expand_grid(param_grid, settings)
+    combos = list(itertools.product(grid['stop_loss'], grid['target']))
+
+    def tasks():
+        for ticker in tickers:
+            groups = list(prepared_groups(ticker, settings, grid))
+            days = numpy.unique(numpy.concatenate([epoch_ns(arrays['index']) // NS_PER_DAY for _, arrays in groups]))
+            for fold, (train_start, test_start, test_stop) in enumerate(fold_bounds(days, train_days, test_days,
+                                                                                   step_days)):
+                cut = [(group, slice_arrays(arrays, train_start, test_stop)) for group, arrays in groups]
+                info = {'Ticker': ticker, 'Fold': fold, 'TrainStart': pandas.Timestamp(train_start),
+                        'TestStart': pandas.Timestamp(test_start), 'TestEnd': pandas.Timestamp(test_stop)}
+                yield info, cut, test_start
+
+    def row(info, result):
+        params, value, summary = result
+        return {**info, **params, f'Train{metric}': value, **summary.result()}
+
+    rows = []
+    if workers is None or workers <= 1:
+        for info, cut, test_start in tasks():
+            rows.append(row(info, evaluate_fold(cut, test_start, combos, settings, metric, maximize)))
+    else:
+        infos = []
+
+        def fold_tasks():
+            for info, cut, test_start in tasks():
+                infos.append(info)
+                yield cut, test_start, combos, settings, metric, maximize
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for i, result in enumerate(ordered_map(executor, evaluate_fold, fold_tasks(), 2 * workers)):
+                rows.append(row(infos[i], result))
+    return pandas.DataFrame(rows)
@@ -0,0 +1,61 @@
+import numpy
+
+from BtAssessmentLib.engine import simulate, epoch_ns
+from BtAssessmentLib.stats import Summary
+
+
+def evaluate(group, arrays, combos, settings):
+    """(parameters, Summary) of every SL/TP combination of one group, the orderbooks are dropped right away."""
+    results = []
+    group = dict(group)
+    timeframe = group.pop('Timeframe')
+    for stop_loss, target in combos:
+        orderbook, _ = simulate(group['Ticker'], **arrays, quantity=settings['quantity'],
+                                capital=settings['capital'], stop_loss=stop_loss, target=target,
+                                timeframe=timeframe, ordertype=settings['ordertype'], pref_sl=settings['pref_sl'])
+        results.append(({**group, 'StopLoss': stop_loss, 'Target': target},
+                        Summary().add(orderbook, settings['capital'])))
+    return results
+
+
+def slice_arrays(arrays, start, stop):
+    """
+    simulate() arrays of the bars in [start, stop) epoch nanoseconds (None: open end), as views of the full
+    range arrays.
+
+    Indicators were computed on the full range, so the first bars of a slice keep their warm-up. The 1-minute
+    path of intrabar arrays is cut to the slice and its per-bar row ranges rebased onto it.
+    """
+    ns = epoch_ns(arrays['index'])
+    first = 0 if start is None else numpy.searchsorted(ns, start)
+    stop = len(ns) if stop is None else numpy.searchsorted(ns, stop)
+    result = {key: value[first:stop] for key, value in arrays.items() if key != 'intrabar'}
+    if 'intrabar' in arrays:
+        intrabar = arrays['intrabar']
+        lo = intrabar['first'][first] if stop > first else 0
+        hi = intrabar['stop'][stop - 1] if stop > first else 0
+        result['intrabar'] = {**{key: intrabar[key][lo:hi] for key in ('minute', 'open_', 'high', 'low')},
+                              'first': intrabar['first'][first:stop] - lo,
+                              'stop': intrabar['stop'][first:stop] - lo}
+    return result
+
+
+def evaluate_fold(groups, test_start, combos, settings, metric='CumPnL', maximize=True):
+    """
+    Train every (group, SL/TP) combination on the bars before test_start and test the best one on the rest.
+
+    groups are (group, arrays) pairs already cut to the fold. The best combination has the highest `metric`
+    column of its train Summary, the lowest with maximize=False (NaN ranks last, ties keep the grid order).
+    Returns (parameters, train metric, test Summary).
+    """
+    best, best_rank = None, None
+    for group, arrays in groups:
+        for params, summary in evaluate(group, slice_arrays(arrays, None, test_start), combos, settings):
+            value = summary.result()[metric]
+            rank = -numpy.inf if value != value else value if maximize else -value
+            if best is None or rank > best_rank:
+                best, best_rank = (params, value, group, arrays), rank
+    params, value, group, arrays = best
+    test = slice_arrays(arrays, test_start, None)
+    [(_, summary)] = evaluate(group, test, [(params['StopLoss'], params['Target'])], settings)
+    return {k: v for k, v in params.items() if k != 'Ticker'}, value, summary
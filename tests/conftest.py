@@ -0,0 +1,21 @@
+import pytest
+
+from BtAssessmentLib.bench import synthetic_universe
+from BtAssessmentLib.deps import DF2DB
+
+START_DATE, END_DATE = '2023-01-02 09-15', '2023-01-10 15-30'
+TICKERS = ['T0', 'T1', 'T2']
+
+
+@pytest.fixture(scope='session')
+def db(tmp_path_factory):
+    """SQLite database with 7 days of synthetic 1-minute candles (off-minute and missing bars) of TICKERS."""
+    path = str(tmp_path_factory.mktemp('data') / 'candles.db')
+    DF2DB(synthetic_universe(len(TICKERS), 7, seed=1), path, 'minute_candle')
+    return path
+
+
+@pytest.fixture
+def btest_kwargs(db):
+    return dict(start_date=START_DATE, end_date=END_DATE, bar_interval='1min', quantity=10, capital=100000,
+                stop_loss=.3, target=.4, db_name=db)
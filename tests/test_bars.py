@@ -0,0 +1,57 @@
+import numpy
+import pandas
+import pytest
+
+from BtAssessmentLib import BTest
+from BtAssessmentLib.deps import DB2DF
+from BtAssessmentLib.main import interval_tests
+from conftest import START_DATE, END_DATE, TICKERS
+
+
+def minute_bars(db, ticker):
+    start, end = (pandas.to_datetime(x, format='%Y-%m-%d %H-%M') for x in (START_DATE, END_DATE))
+    return DB2DF(db, 'minute_candle', ticker, start, end, ['OpenValue', 'High', 'Low', 'CloseValue'])
+
+
+@pytest.mark.parametrize('bar_interval, change_bar_interval_at_start', [('1min', False), ('5min', True)])
+def test_bars_with_extra_columns(db, btest_kwargs, bar_interval, change_bar_interval_at_start):
+    kwargs = {**btest_kwargs, 'bar_interval': bar_interval,
+              'change_bar_interval_at_start': change_bar_interval_at_start}
+    for ticker in TICKERS:
+        bars = minute_bars(db, ticker)
+        bars['Volume'] = numpy.nan
+        bars['Note'] = None
+        expected = BTest(ticker=ticker, **kwargs)
+        given = BTest(ticker=ticker, bars=bars, **kwargs)
+        orders = expected.run()
+        assert len(orders) > 0 and given.run() == orders
+        pandas.testing.assert_frame_equal(given.get_df(), expected.get_df())
+        assert list(bars.columns[-2:]) == ['Volume', 'Note']
+
+
+@pytest.mark.parametrize('change_bar_interval_at_start', [False, True])
+def test_interval_tests_match_separate_runs(btest_kwargs, change_bar_interval_at_start):
+    kwargs = {**btest_kwargs, 'bar_interval': ['1min', '5min', '15min'], 'table_name': 'minute_candle',
+              'change_bar_interval_at_start': change_bar_interval_at_start}
+    for ticker in TICKERS:
+        for interval, b in interval_tests(ticker, kwargs).items():
+            expected = BTest(ticker=ticker, **{**kwargs, 'bar_interval': interval})
+            assert b.run() == expected.run()
+            pandas.testing.assert_frame_equal(b.get_df(), expected.get_df())
+
+
+@pytest.mark.parametrize('bar_interval, change_bar_interval_at_start', [('1min', False), ('5min', True)])
+def test_bars_do_not_share_cache_entries_with_the_database(db, btest_kwargs, tmp_path, bar_interval,
+                                                           change_bar_interval_at_start):
+    kwargs = {**btest_kwargs, 'bar_interval': bar_interval, 'change_bar_interval_at_start': change_bar_interval_at_start,
+              'cache_dir': str(tmp_path / 'cache')}
+    uncached = {key: value for key, value in kwargs.items() if key != 'cache_dir'}
+    own = BTest(ticker='T0', **uncached).run()
+    other = BTest(ticker='T0', bars=minute_bars(db, 'T1'), **uncached).run()
+    assert own != other
+    # bars first, then the database, then bars again: every run must see its own input.
+    assert BTest(ticker='T0', bars=minute_bars(db, 'T1'), **kwargs).run() == other
+    assert BTest(ticker='T0', **kwargs).run() == own
+    cached = BTest(ticker='T0', bars=minute_bars(db, 'T1'), profile=True, **kwargs)
+    assert cached.run() == other
+    assert cached.profile_report()['counters'].get('cache_hits') == 1
@@ -0,0 +1,48 @@
+import pandas
+import pytest
+
+from BtAssessmentLib import BTest
+from BtAssessmentLib.barstore import BarStore
+from BtAssessmentLib.deps import DB2DF
+from conftest import START_DATE, END_DATE, TICKERS
+
+RANGES = [(START_DATE, END_DATE), ('2023-01-03 11-07', '2023-01-09 13-42')]
+COLUMNS = ['OpenValue', 'High', 'Low', 'CloseValue']
+
+
+@pytest.fixture(scope='module')
+def store(db, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('store'))
+    counts = BarStore(path).import_table(db)
+    assert sorted(counts) == TICKERS and all(counts.values())
+    # A second import finds nothing newer than the stored bars.
+    assert BarStore(path).import_table(db) == counts
+    return path
+
+
+@pytest.mark.parametrize('start_date, end_date', RANGES)
+def test_frames_match_sqlite(db, store, start_date, end_date):
+    start, end = (pandas.to_datetime(x, format='%Y-%m-%d %H-%M') for x in (start_date, end_date))
+    for ticker in TICKERS:
+        expected = DB2DF(db, 'minute_candle', ticker, start, end, COLUMNS)
+        frame = DB2DF(store, 'minute_candle', ticker, start, end, COLUMNS, storage='mmap')
+        assert len(frame) > 0
+        assert frame.index.min() >= start and frame.index.max() <= end
+        pandas.testing.assert_frame_equal(frame, expected, check_index_type=False, check_freq=False)
+
+
+@pytest.mark.parametrize('start_date, end_date', RANGES)
+@pytest.mark.parametrize('bar_interval, change_bar_interval_at_start', [('1min', False), ('5min', True)])
+def test_orderbooks_match_sqlite(btest_kwargs, store, start_date, end_date, bar_interval,
+                                 change_bar_interval_at_start):
+    kwargs = {**btest_kwargs, 'start_date': start_date, 'end_date': end_date, 'bar_interval': bar_interval,
+              'change_bar_interval_at_start': change_bar_interval_at_start}
+    orders = 0
+    for ticker in TICKERS:
+        sqlite = BTest(ticker=ticker, **kwargs)
+        mmap = BTest(ticker=ticker, storage='mmap', **{**kwargs, 'db_name': store})
+        expected = sqlite.run()
+        assert mmap.run() == expected
+        pandas.testing.assert_frame_equal(mmap.get_df(), sqlite.get_df(), check_freq=False)
+        orders += len(expected)
+    assert orders > 0
@@ -0,0 +1,47 @@
+import pandas
+import pytest
+
+from BtAssessmentLib import bench
+
+
+def report(**bars_per_sec):
+    return pandas.DataFrame([{'stage': stage, 'tickers': 5, 'days': 20, 'workers': 1, 'bars': 100,
+                              'seconds': 100 / value, 'bars_per_sec': value} for stage, value in bars_per_sec.items()])
+
+
+def test_regressions_reports_missing_stages():
+    baseline = {'machine': bench.machine_info(),
+                'results': report(DB2DF=100.0, bb=100.0, dropped=100.0).to_dict('records')}
+    failed = bench.regressions(report(DB2DF=90.0, bb=50.0, added=100.0), baseline, tolerance=0.25)
+    assert dict(zip(failed['stage'], failed['problem'])) == {'bb': 'regressed', 'dropped': 'missing',
+                                                             'added': 'not in baseline'}
+
+
+def test_regressions_gate_cold_start_separately():
+    cold = {'import BtAssessmentLib': 100.0, 'import BtAssessmentLib.cli': 100.0}
+    baseline = {'machine': bench.machine_info(), 'results': report(DB2DF=100.0, **cold).to_dict('records')}
+    failed = bench.regressions(report(DB2DF=70.0, **{'import BtAssessmentLib': 60.0,
+                                                     'import BtAssessmentLib.cli': 40.0}), baseline)
+    assert dict(zip(failed['stage'], failed['problem'])) == {'DB2DF': 'regressed',
+                                                             'import BtAssessmentLib.cli': 'regressed'}
+    failed = bench.regressions(report(DB2DF=100.0, **{'import BtAssessmentLib': 100.0}), baseline)
+    assert dict(zip(failed['stage'], failed['problem'])) == {'import BtAssessmentLib.cli': 'missing'}
+
+
+@pytest.fixture
+def suite(monkeypatch):
+    result = report(DB2DF=100.0, bb=100.0)
+    monkeypatch.setattr(bench, 'run_suite', lambda *args, **kwargs: result.copy())
+    return result
+
+
+def test_main_exit_status(suite, tmp_path, monkeypatch):
+    path = str(tmp_path / 'baseline.json')
+    assert bench.main(['--baseline', path]) == 2
+    assert bench.main(['--baseline', path, '--save']) == 0
+    assert bench.main(['--baseline', path]) == 0
+    suite.loc[suite['stage'] == 'bb', 'bars_per_sec'] = 10.0
+    assert bench.main(['--baseline', path]) == 1
+    suite.loc[suite['stage'] == 'bb', 'bars_per_sec'] = 100.0
+    monkeypatch.setattr(bench, 'machine_info', lambda: {**bench.load_baseline(path)['machine'], 'cpus': -1})
+    assert bench.main(['--baseline', path]) == 2
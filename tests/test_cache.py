@@ -0,0 +1,37 @@
+import os
+import shutil
+
+from BtAssessmentLib import BTest
+from BtAssessmentLib.bench import synthetic_universe
+from BtAssessmentLib.deps import DF2DB, data_version
+
+
+def run(kwargs, **extra):
+    bt = BTest(ticker='T0', profile=True, **{**kwargs, **extra})
+    return bt.run(), bt.profile_report()['counters'].get('cache_hits', 0)
+
+
+def test_cold_warm_and_rewritten_db(btest_kwargs, tmp_path):
+    db = str(tmp_path / 'candles.db')
+    shutil.copy(btest_kwargs['db_name'], db)
+    kwargs = {**btest_kwargs, 'db_name': db, 'cache_dir': str(tmp_path / 'cache')}
+
+    cold, hits = run(kwargs)
+    assert hits == 0 and len(cold) > 0
+    warm, hits = run(kwargs)
+    assert hits == 1 and warm == cold
+
+    version = data_version(db, 'minute_candle')
+    candles = synthetic_universe(3, 7, seed=2)
+    DF2DB(candles, db, 'minute_candle')
+    assert data_version(db, 'minute_candle') != version
+    rewritten, hits = run(kwargs)
+    assert hits == 0
+    assert rewritten == run(kwargs, cache_dir='')[0]
+    assert rewritten != cold
+
+
+def test_data_version_of_missing_db(tmp_path):
+    db = str(tmp_path / 'missing.db')
+    assert data_version(db, 'minute_candle') is None
+    assert not os.path.exists(db)
@@ -0,0 +1,59 @@
+import json
+
+import pandas
+import pytest
+
+from BtAssessmentLib import BT
+from BtAssessmentLib.cli import main
+from conftest import START_DATE, END_DATE, TICKERS
+
+GRID = {'stop_loss': [.3, .5], 'target': [.4]}
+
+
+@pytest.fixture
+def config(db, tmp_path):
+    bt = dict(ticker=TICKERS, start_date=START_DATE, end_date=END_DATE, bar_interval='1min', quantity=10,
+              capital=100000, stop_loss=.3, target=.4, db_name=db)
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps({'bt': bt, 'args': {'workers': 1}}))
+    return str(path), bt
+
+
+def read_table(path):
+    return pandas.read_csv(path, index_col=0)
+
+
+def test_run(config, tmp_path, capsys):
+    path, bt = config
+    output = str(tmp_path / 'summary.csv')
+    assert main([path, '--output', output]) == 0
+    expected = BT(**bt)
+    expected.run(workers=1)
+    expected = expected.summary()
+    table = read_table(output)
+    assert list(table.index) == TICKERS + ['All']
+    pandas.testing.assert_frame_equal(table, expected, check_dtype=False, check_names=False)
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].split()[:2] == ['Trades', 'Wins'] and [line.split()[0] for line in lines[1:]] == TICKERS + ['All']
+
+
+def test_sweep(config, tmp_path):
+    path, bt = config
+    output = str(tmp_path / 'sweep.csv')
+    with open(path) as f:
+        spec = json.load(f)
+    spec['args']['param_grid'] = GRID
+    with open(path, 'w') as f:
+        json.dump(spec, f)
+    assert main([path, '--mode', 'sweep', '--output', output]) == 0
+    expected = BT(**bt).sweep(GRID, workers=1)
+    table = read_table(output)
+    assert len(table) == len(TICKERS) * 2
+    pandas.testing.assert_frame_equal(table, expected, check_dtype=False)
+
+
+def test_report_turns_on_profiling(config, tmp_path):
+    path, _ = config
+    report = tmp_path / 'report.json'
+    assert main([path, '--report', str(report)]) == 0
+    assert json.loads(report.read_text())['counters']['orders'] > 0
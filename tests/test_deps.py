@@ -0,0 +1,132 @@
+import os
+import sqlite3
+
+import numpy
+import pandas
+import pytest
+
+from BtAssessmentLib import BT, deps
+from BtAssessmentLib.bench import synthetic_candles, synthetic_universe
+from BtAssessmentLib.deps import DB2DF, DF2DB, ingest, resample_session
+
+COLUMNS = ['OpenValue', 'High', 'Low', 'CloseValue']
+
+
+def legacy_db(path, df):
+    """Table as written by older versions: CreatedOn as text, no index."""
+    with sqlite3.connect(path) as db:
+        df.to_sql('minute_candle', db, index=False)
+
+
+@pytest.fixture
+def candles():
+    return synthetic_universe(2, 4, seed=3)
+
+
+@pytest.mark.parametrize('start, end', [(None, None), ('2023-01-03 09:16:01', '2023-01-04 13:42')])
+def test_legacy_layout_reads_like_epoch_layout(tmp_path, candles, start, end):
+    legacy, epoch = str(tmp_path / 'legacy.db'), str(tmp_path / 'epoch.db')
+    legacy_db(legacy, candles)
+    DF2DB(candles, epoch, 'minute_candle')
+    for ticker in ('T0', 'T1'):
+        expected = DB2DF(epoch, 'minute_candle', ticker, start, end, COLUMNS)
+        assert len(expected) > 0
+        pandas.testing.assert_frame_equal(DB2DF(legacy, 'minute_candle', ticker, start, end, COLUMNS), expected)
+
+
+def test_append_converts_legacy_layout(tmp_path, candles):
+    legacy, epoch = str(tmp_path / 'legacy.db'), str(tmp_path / 'epoch.db')
+    split = candles['CreatedOn'] < pandas.Timestamp('2023-01-04')
+    legacy_db(legacy, candles[split])
+    DF2DB(candles[~split], legacy, 'minute_candle', if_exists='append')
+    DF2DB(candles, epoch, 'minute_candle')
+    with sqlite3.connect(legacy) as db:
+        assert db.execute('select distinct typeof(CreatedOn) from minute_candle').fetchall() == [('integer',)]
+    for ticker in ('T0', 'T1'):
+        expected = DB2DF(epoch, 'minute_candle', ticker, columns=COLUMNS)
+        pandas.testing.assert_frame_equal(DB2DF(legacy, 'minute_candle', ticker, columns=COLUMNS), expected)
+        pandas.testing.assert_frame_equal(
+            DB2DF(legacy, 'minute_candle', ticker, '2023-01-03 12:00', '2023-01-05 10:00', COLUMNS),
+            DB2DF(epoch, 'minute_candle', ticker, '2023-01-03 12:00', '2023-01-05 10:00', COLUMNS))
+
+
+def test_append_rejects_unparseable_dates(tmp_path, candles):
+    path = str(tmp_path / 'legacy.db')
+    legacy_db(path, candles.assign(CreatedOn=candles['CreatedOn'].dt.strftime('%d/%m/%Y %H:%M')))
+    with pytest.raises(Exception, match='not dates'):
+        DF2DB(candles, path, 'minute_candle', if_exists='append')
+
+
+def test_resample_session_buckets():
+    stamps = ['2023-01-02 09:07:01', '2023-01-02 09:15:00', '2023-01-02 09:16:01', '2023-01-02 09:18:00',
+              '2023-01-02 09:19:00', '2023-01-02 09:30:00', '2023-01-02 09:31:00', '2023-01-03 09:15:00']
+    close = numpy.arange(1.0, 9.0)
+    df = pandas.DataFrame({'OpenValue': close - .5, 'High': close + 1, 'Low': close - 1, 'CloseValue': close},
+                          index=pandas.DatetimeIndex(pandas.to_datetime(stamps), name='CreatedOn'))
+    bars = resample_session(df, x_minutes=5)
+    # 09:07:01 is before the session, 09:16:01 belongs to 09:15, nothing is emitted for 09:20 and 09:25.
+    expected = pandas.DataFrame({'OpenValue': [1.5, 5.5, 7.5], 'High': [6.0, 8.0, 9.0], 'Low': [1.0, 5.0, 7.0],
+                                 'CloseValue': [5.0, 7.0, 8.0], 'Bars': [4, 2, 1], 'Missing': [1, 13, 4]},
+                                index=pandas.DatetimeIndex(pandas.to_datetime(['2023-01-02 09:15', '2023-01-02 09:30',
+                                                                               '2023-01-03 09:15']),
+                                                           name='CreatedOn'))
+    pandas.testing.assert_frame_equal(bars, expected)
+
+
+def test_resample_session_is_hierarchical():
+    df = synthetic_candles('T0', 3, seed=2, missing=0.2)
+    coarse = df
+    for minutes in (15, 30, 60):
+        coarse = resample_session(coarse, x_minutes=minutes)
+        pandas.testing.assert_frame_equal(coarse, resample_session(df, x_minutes=minutes))
+    assert coarse.index[0] == pandas.Timestamp('2023-01-02 09:15')
+
+
+@pytest.fixture
+def ingests(monkeypatch):
+    """Calls of EX2DB and of the content hash during the test."""
+    calls = {'EX2DB': 0, 'sha256': 0}
+    ex2db, fingerprint = deps.EX2DB, deps.file_fingerprint
+
+    def counted_ex2db(*args, **kwargs):
+        calls['EX2DB'] += 1
+        return ex2db(*args, **kwargs)
+
+    def counted_fingerprint(filename, with_hash=True):
+        calls['sha256'] += with_hash
+        return fingerprint(filename, with_hash)
+
+    monkeypatch.setattr(deps, 'EX2DB', counted_ex2db)
+    monkeypatch.setattr(deps, 'file_fingerprint', counted_fingerprint)
+    return calls
+
+
+def test_ingest_skips_unchanged_sources(tmp_path, candles, ingests):
+    source, db = str(tmp_path / 'candles.xlsx'), str(tmp_path / 'candles.db')
+    candles.to_excel(source, index=False)
+    assert ingest(source, db, 'minute_candle') is True
+    assert ingests == {'EX2DB': 1, 'sha256': 1}
+    # Same mtime and size: the file is not even hashed.
+    assert ingest(source, db, 'minute_candle') is False
+    assert ingests == {'EX2DB': 1, 'sha256': 1}
+    # Touched only: the hash decides and matches.
+    stat = os.stat(source)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert ingest(source, db, 'minute_candle') is False
+    assert ingests == {'EX2DB': 1, 'sha256': 2}
+    # New content is ingested again.
+    candles[candles['InstrumentIdentifier'] == 'T0'].to_excel(source, index=False)
+    assert ingest(source, db, 'minute_candle') is True
+    assert ingests['EX2DB'] == 2
+    assert len(DB2DF(db, 'minute_candle', 'T1')) == 0 and len(DB2DF(db, 'minute_candle', 'T0')) > 0
+
+
+def test_bt_run_ingests_once(tmp_path, candles, ingests):
+    source, db = str(tmp_path / 'candles.xlsx'), str(tmp_path / 'candles.db')
+    candles.to_excel(source, index=False)
+    bt = BT(ticker=['T0', 'T1'], start_date='2023-01-02 09-15', end_date='2023-01-05 15-30', bar_interval='1min',
+            quantity=10, capital=100000, stop_loss=.3, target=.4, db_name=db, excel_source=source)
+    bt.run(workers=2)
+    assert ingests['EX2DB'] == 1 and all(len(orders) > 0 for orders in bt.results_dict.values())
+    bt.run(workers=2)
+    assert ingests['EX2DB'] == 1
@@ -0,0 +1,24 @@
+import itertools
+
+import pytest
+
+from BtAssessmentLib import BTest
+from conftest import TICKERS
+
+BARS = [('1min', False), ('1min', True), ('5min', True), ('15min', True)]
+
+
+@pytest.mark.parametrize('ordertype, pref_sl, bars', list(itertools.product(['CNC', 'MIS'], [True, False], BARS)))
+def test_vectorized_engine_matches_loop(btest_kwargs, ordertype, pref_sl, bars):
+    bar_interval, change_bar_interval_at_start = bars
+    kwargs = {**btest_kwargs, 'ordertype': ordertype, 'pref_sl': pref_sl, 'bar_interval': bar_interval,
+              'change_bar_interval_at_start': change_bar_interval_at_start}
+    orders = 0
+    for ticker in TICKERS:
+        loop = BTest(ticker=ticker, engine='loop', **kwargs)
+        vectorized = BTest(ticker=ticker, engine='vectorized', **kwargs)
+        expected = loop.run()
+        assert vectorized.run() == expected
+        assert vectorized.capital == loop.capital
+        orders += len(expected)
+    assert orders > 0
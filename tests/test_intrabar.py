@@ -0,0 +1,46 @@
+import numpy
+import pandas
+import pytest
+
+from BtAssessmentLib import BTest
+
+SIGNAL, ENTRY = 21, 22
+
+
+def minute_bars(same_minute):
+    """
+    One session of 1-minute bars. The 5-minute bars alternate between 100 and 100.1 until bar SIGNAL closes at
+    100.5 above the upper band. The short entry at the open (100) of bar ENTRY sets SL 101 and TP 99, and the
+    bar touches both: minute 1 reaches 98.9 (TP), minute 2 101.2 (SL), or minute 1 both with same_minute.
+    """
+    rows = []
+    for bar in range(30):
+        price = 100.5 if bar == SIGNAL else 100.1 if bar < SIGNAL and bar % 2 else 100.0
+        rows.extend([[price, price, price, price]] * 5)
+    first = ENTRY * 5
+    rows[first + 1] = [100.0, 101.2 if same_minute else 100.2, 98.9, 99.5]
+    rows[first + 2] = [99.5, 101.2, 99.4, 100.0]
+    index = pandas.date_range('2023-01-02 09:15', periods=len(rows), freq='1min', name='CreatedOn')
+    return pandas.DataFrame(rows, index=index, columns=['OpenValue', 'High', 'Low', 'CloseValue'])
+
+
+@pytest.mark.parametrize('engine', ['loop', 'vectorized'])
+@pytest.mark.parametrize('same_minute, pref_sl, intrabar, reason', [
+    (False, True, False, 'SL Hit'),   # coarse bar only: pref_sl decides
+    (False, False, False, 'TP Hit'),
+    (False, True, True, 'TP Hit'),    # the 1-minute path reaches TP first whatever pref_sl says
+    (False, False, True, 'TP Hit'),
+    (True, True, True, 'SL Hit'),     # both in the same minute: back to pref_sl
+    (True, False, True, 'TP Hit'),
+])
+def test_sl_tp_tie(engine, same_minute, pref_sl, intrabar, reason):
+    b = BTest(ticker='T0', start_date='2023-01-02 09-15', end_date='2023-01-02 15-30', bar_interval='5min',
+              quantity=10, capital=100000, stop_loss=1, target=1, bars=minute_bars(same_minute),
+              change_bar_interval_at_start=True, pref_sl=pref_sl, intrabar=intrabar, engine=engine)
+    entry, exit_ = b.run()
+    bar = pandas.Timestamp('2023-01-02 09:15') + pandas.Timedelta(minutes=5 * ENTRY)
+    assert (entry['OrderSide'], entry['OrderDateTime'], entry['SLPrice'], entry['TPPrice']) == \
+        ('Short', bar, 101.0, 99.0)
+    assert (exit_['Reason'], exit_['OrderDateTime']) == (reason, bar)
+    assert exit_['InstrumentPrice'] == (101.0 if reason == 'SL Hit' else 99.0)
+    numpy.testing.assert_allclose(exit_['PnL'], 10 * (100.0 - exit_['InstrumentPrice']))
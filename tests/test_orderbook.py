@@ -0,0 +1,31 @@
+import numpy
+
+from BtAssessmentLib import BTest
+from BtAssessmentLib.frames import to_frame, to_records
+from BtAssessmentLib.orderbook import Orderbook, CATEGORIES, DTYPES
+
+
+def orderbook(btest_kwargs, **kwargs):
+    bt = BTest(ticker='T0', **{**btest_kwargs, **kwargs})
+    bt.run()
+    return bt.get_orderbook()
+
+
+def test_to_frame_shares_buffers(btest_kwargs):
+    ob = orderbook(btest_kwargs)
+    frame = to_frame(ob)
+    assert len(ob) > 0 and len(frame) == len(ob)
+    for col in DTYPES:
+        values = frame[col].cat.codes.to_numpy() if col in CATEGORIES else frame[col].to_numpy()
+        assert numpy.shares_memory(values, ob[col]), col
+
+
+def test_equals(btest_kwargs):
+    ob = orderbook(btest_kwargs)
+    assert ob.equals(orderbook(btest_kwargs, engine='vectorized'))
+    assert not ob.equals(orderbook(btest_kwargs, target=.5))
+    assert not ob.equals(to_records(ob))
+    assert ob != orderbook(btest_kwargs)
+    assert ob.__hash__ is not None
+    empty = Orderbook('T0')
+    assert empty.equals(Orderbook('T0')) and not empty.equals(Orderbook('T1'))
@@ -0,0 +1,40 @@
+import pandas
+import pytest
+
+from BtAssessmentLib import BT
+from conftest import START_DATE, END_DATE, TICKERS
+
+
+@pytest.mark.parametrize('backend', ['thread', 'process'])
+@pytest.mark.parametrize('bar_interval', ['5min', ['1min', '5min', '15min']])
+def test_run_to_disk_matches_run(db, tmp_path, backend, bar_interval):
+    kwargs = dict(ticker=TICKERS, start_date=START_DATE, end_date=END_DATE, bar_interval=bar_interval, quantity=10,
+                  capital=100000, stop_loss=.3, target=.4, db_name=db, change_bar_interval_at_start=True,
+                  profile=True)
+    expected = BT(**kwargs)
+    results = expected.run()
+    bt = BT(**kwargs)
+    sink = bt.run_to_disk(str(tmp_path), workers=2, backend=backend)
+    assert sorted(sink.paths) == sorted(results)
+    for key, frame in results.items():
+        pandas.testing.assert_frame_equal(pandas.read_parquet(sink.paths[key]), frame, check_categorical=False)
+    summary = expected.summary()
+    pandas.testing.assert_frame_equal(sink.summary().loc[summary.index], summary)
+    for key, report in bt.profile_dict.items():
+        assert report['counters'] == expected.profile_dict[key]['counters']
+        assert {'load', 'run', 'strategy'} <= set(report['stages']) and report['wall'] > 0
+
+
+@pytest.mark.parametrize('bar_interval, change_bar_interval_at_start',
+                         [('1min', False), ('5min', True), (['1min', '5min', '15min'], False),
+                          (['1min', '5min', '15min'], True)])
+def test_process_backend_matches_threads(db, bar_interval, change_bar_interval_at_start):
+    kwargs = dict(ticker=TICKERS, start_date=START_DATE, end_date=END_DATE, bar_interval=bar_interval, quantity=10,
+                  capital=100000, stop_loss=.3, target=.4, db_name=db,
+                  change_bar_interval_at_start=change_bar_interval_at_start)
+    threads = BT(**kwargs).run(workers=2, backend='thread')
+    processes = BT(**kwargs).run(workers=2, backend='process')
+    assert list(processes) == list(threads)
+    assert sum(len(frame) for frame in threads.values()) > 0
+    for key, frame in threads.items():
+        pandas.testing.assert_frame_equal(processes[key], frame)
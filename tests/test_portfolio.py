@@ -0,0 +1,104 @@
+import numpy
+import pandas
+import pytest
+
+from BtAssessmentLib import BTest, Portfolio
+from BtAssessmentLib.deps import DF2DB
+from BtAssessmentLib.frames import to_frame
+from BtAssessmentLib.orderbook import ORDER_COLUMNS
+from conftest import START_DATE, END_DATE, TICKERS
+
+# Balance is the pool balance in a Portfolio, the ticker's own in a BTest.
+COLUMNS = [col for col in ORDER_COLUMNS if col not in ('Ticker', 'Balance')]
+
+
+def portfolio(db, **kwargs):
+    kwargs.setdefault('capital', 50000)
+    return Portfolio(ticker=TICKERS, start_date=START_DATE, end_date=END_DATE, bar_interval='5min', quantity=10,
+                     stop_loss=.3, target=.4, db_name=db, change_bar_interval_at_start=True, **kwargs)
+
+
+def test_equity_freq(db):
+    minutely = portfolio(db)
+    orders = minutely.run()
+    assert len(orders) > 0 and orders['Ticker'].nunique() == len(TICKERS)
+    assert orders['OrderDateTime'].is_monotonic_increasing
+
+    daily = portfolio(db, equity_freq='1D')
+    assert daily.run().equals(orders)
+    expected = minutely.equity_curve.groupby(minutely.equity_curve.index.normalize()).last()
+    assert (daily.equity_curve.to_numpy() == expected.to_numpy()).all()
+    assert (daily.equity_curve.index.normalize() == expected.index).all()
+    assert daily.cagr == minutely.cagr
+
+    none = portfolio(db, equity_freq=None)
+    assert none.run().equals(orders)
+    assert none.equity_curve is None and none.cagr == minutely.cagr
+
+
+def independent_orders(db, ticker, capital):
+    b = BTest(ticker=ticker, start_date=START_DATE, end_date=END_DATE, bar_interval='5min', quantity=10,
+              capital=capital, stop_loss=.3, target=.4, db_name=db, change_bar_interval_at_start=True)
+    b.run()
+    orders = to_frame(b.get_orderbook())[COLUMNS]
+    for col in ('OrderSide', 'Status', 'Reason'):
+        orders[col] = orders[col].astype(object)
+    return orders
+
+
+def open_positions(orders):
+    """Number of open positions and capital reserved by them after every order."""
+    reserved, counts, totals = {}, [], []
+    for ticker, side, price in zip(orders['Ticker'], orders['OrderSide'], orders['OrderPrice']):
+        if side == 'Short':
+            reserved[ticker] = price
+        else:
+            reserved.pop(ticker)
+        counts.append(len(reserved))
+        totals.append(sum(reserved.values()))
+    return numpy.array(counts), numpy.array(totals)
+
+
+def test_large_pool_equals_independent_runs(db):
+    orders = portfolio(db, capital=10 ** 9).run()
+    for ticker in TICKERS:
+        expected = independent_orders(db, ticker, 10 ** 9)
+        assert len(expected) > 0
+        pandas.testing.assert_frame_equal(orders.loc[orders['Ticker'] == ticker, COLUMNS]
+                                          .reset_index(drop=True), expected)
+    assert open_positions(orders)[0].max() == len(TICKERS)
+
+
+@pytest.mark.parametrize('capital, max_open', [(20000, 1), (60000, 2)])
+def test_small_pool_caps_open_positions(db, capital, max_open):
+    orders = portfolio(db, capital=capital).run()
+    counts, reserved = open_positions(orders)
+    assert (orders['FreeCapital'] >= 0).all()
+    numpy.testing.assert_allclose(orders['Balance'] - orders['FreeCapital'], reserved)
+    assert counts.max() == max_open
+
+
+def spike_db(path, spikes):
+    """1-minute bars of tickers falling from 100 whose close jumps above the band by spikes[ticker] at 10:00."""
+    index = pandas.date_range('2023-01-02 09:15', '2023-01-02 15:29', freq='1min')
+    frames = []
+    for ticker, spike in spikes.items():
+        close = 100 - 0.01 * numpy.arange(len(index))
+        close[index == '2023-01-02 10:00'] += spike
+        frames.append(pandas.DataFrame({'CreatedOn': index, 'InstrumentIdentifier': ticker, 'OpenValue': close,
+                                        'High': close + 0.1, 'Low': close - 0.1, 'CloseValue': close}))
+    DF2DB(pandas.concat(frames, ignore_index=True), path, 'minute_candle')
+    return path
+
+
+@pytest.mark.parametrize('tickers', [['A', 'B'], ['B', 'A']])
+def test_same_minute_entries_by_signal_strength(tmp_path, tickers):
+    db = spike_db(str(tmp_path / 'spikes.db'), {'A': 1, 'B': 3})
+    signal_bar = pandas.Timestamp('2023-01-02 10:01')
+    # Capital for one position: only the stronger signal enters. With room for both, it still enters first.
+    for capital, expected in ((1500, ['B']), (3000, ['B', 'A'])):
+        orders = Portfolio(ticker=tickers, start_date='2023-01-02 09-15', end_date='2023-01-02 15-30',
+                           bar_interval='1min', quantity=10, capital=capital, stop_loss=5, target=5, db_name=db).run()
+        entries = orders[orders['OrderSide'] == 'Short']
+        assert entries['OrderDateTime'].min() == signal_bar
+        assert list(entries.loc[entries['OrderDateTime'] == signal_bar, 'Ticker']) == expected
@@ -0,0 +1,47 @@
+import logging
+
+import pytest
+
+from BtAssessmentLib import BTest
+from BtAssessmentLib.profiling import enable_logging, logger
+from BtAssessmentLib.stream import replay
+
+
+@pytest.fixture
+def clean_logger():
+    handlers, level = logger.handlers[:], logger.level
+    logger.handlers, logger.level = [], logging.NOTSET
+    yield logger
+    logger.handlers, logger.level = handlers, level
+
+
+def test_enable_logging_defaults(clean_logger):
+    enable_logging()
+    assert len(clean_logger.handlers) == 1 and clean_logger.level == logging.INFO
+    enable_logging()
+    assert len(clean_logger.handlers) == 1
+
+
+@pytest.mark.parametrize('level', [logging.DEBUG, logging.WARNING])
+def test_enable_logging_keeps_configured_level(clean_logger, level):
+    clean_logger.setLevel(level)
+    enable_logging()
+    assert clean_logger.handlers == [] and clean_logger.level == level
+
+
+def test_enable_logging_keeps_configured_handlers(clean_logger):
+    handler = logging.NullHandler()
+    clean_logger.addHandler(handler)
+    enable_logging()
+    assert clean_logger.handlers == [handler] and clean_logger.level == logging.NOTSET
+
+
+def test_counters_match_across_engines(btest_kwargs):
+    counters = {}
+    for engine, stream in (('loop', False), ('vectorized', False), ('loop', True)):
+        bt = BTest(ticker='T0', engine=engine, stream=stream, profile=True, **btest_kwargs)
+        replay(bt) if stream else bt.run()
+        counters[engine, stream] = bt.profile_report()['counters']
+    expected = counters['loop', False]
+    assert expected['signal_bars'] > 0 and expected['orders'] > 0
+    assert all(c == expected for c in counters.values()), counters
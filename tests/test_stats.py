@@ -0,0 +1,46 @@
+import numpy
+import pandas
+
+from BtAssessmentLib import BT
+from BtAssessmentLib.orderbook import Orderbook
+from BtAssessmentLib.stats import Summary, HOLD_EDGES
+from conftest import START_DATE, END_DATE, TICKERS
+
+MINUTE = 60 * 10 ** 9
+
+
+def orderbook(holds, capital=1000.0):
+    """Orderbook of round trips held for the given minutes, each closed with a PnL of 1."""
+    ob, ts, balance = Orderbook('T0', capital), 0, capital
+    for hold in holds:
+        ob.append(ts, 10.0, 1, 10.0, 11.0, 9.0, 'Short', 'Running', 'Entry', balance, None)
+        ts += hold * MINUTE
+        balance += 1
+        ob.append(ts, 11.0, 1, 11.0, None, None, 'Long', 'Closed', 'TP Hit', balance, 1.0)
+        ts += MINUTE
+    return ob
+
+
+def test_holding_histogram_has_constant_size():
+    short = Summary().add(orderbook([1, 2, 3, 200]))
+    long = Summary().add(orderbook([5, 300, 10 ** 5, 10 ** 7]))
+    assert short.holding.shape == long.holding.shape == HOLD_EDGES.shape
+    result = Summary().merge(short).merge(long).result()
+    holds = numpy.array([1, 2, 3, 200, 5, 300, 10 ** 5, 10 ** 7])
+    assert result['HoldMean'] == holds.mean() and result['HoldMax'] == 10 ** 7
+    assert result['HoldMedian'] == 5.0 and short.result()['HoldMedian'] == 2.0
+    assert 10 ** 5 * 0.95 < Summary().add(orderbook([10 ** 5])).result()['HoldMedian'] <= 10 ** 5
+    single = Summary().add(orderbook([1, 2, 3, 200, 5, 300, 10 ** 5, 10 ** 7])).result()
+    assert all(single[key] == result[key] for key in ('HoldMean', 'HoldMedian', 'HoldP90', 'HoldMax'))
+
+
+def test_sweep_does_not_depend_on_workers(db):
+    bt = BT(ticker=TICKERS, start_date=START_DATE, end_date=END_DATE, bar_interval='5min', quantity=10,
+            capital=100000, stop_loss=.3, target=.4, db_name=db, change_bar_interval_at_start=True)
+    grid = {'stop_loss': [.1, .3], 'target': [.2, .4], 'window': [10, 20]}
+    serial = bt.sweep(grid, workers=1)
+    assert len(serial) == len(TICKERS) * 8
+    pandas.testing.assert_frame_equal(bt.sweep(grid, workers=2), serial)
+    aggregated = bt.sweep(grid, workers=2, aggregate=True)
+    pandas.testing.assert_frame_equal(aggregated, bt.sweep(grid, workers=1, aggregate=True))
+    assert aggregated['Trades'].sum() == serial['Trades'].sum()
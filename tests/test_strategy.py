@@ -0,0 +1,63 @@
+import numpy
+import pandas
+import pytest
+
+from BtAssessmentLib import BTest
+from BtAssessmentLib.strategy import (BB, EMA, RSI, SMA, BOLLINGER_REVERSION, FrameContext, Strategy,
+                                      compile_rule)
+from conftest import TICKERS
+
+
+def frame(n=60, seed=0):
+    close = 100 + numpy.random.default_rng(seed).normal(0, 1, n).cumsum()
+    return pandas.DataFrame({'OpenValue': close, 'High': close + 1, 'Low': close - 1, 'CloseValue': close},
+                            index=pandas.date_range('2023-01-02 09:15', periods=n, freq='1min'))
+
+
+@pytest.mark.parametrize('bar_interval, change_bar_interval_at_start', [('1min', False), ('5min', True)])
+@pytest.mark.parametrize('ordertype', ['CNC', 'MIS'])
+def test_bollinger_reversion_matches_builtin_rules(btest_kwargs, bar_interval, change_bar_interval_at_start,
+                                                   ordertype):
+    kwargs = {**btest_kwargs, 'bar_interval': bar_interval, 'ordertype': ordertype,
+              'change_bar_interval_at_start': change_bar_interval_at_start}
+    for ticker in TICKERS:
+        expected = BTest(ticker=ticker, engine='loop', **kwargs).run()
+        assert len(expected) > 0
+        assert BTest(ticker=ticker, engine='vectorized', strategy=BOLLINGER_REVERSION, **kwargs).run() == expected
+
+
+def test_shared_indicator_is_computed_once(monkeypatch):
+    calls = []
+    compute = BB.compute
+    monkeypatch.setattr(BB, 'compute', lambda self, ctx: calls.append(self.key()) or compute(self, ctx))
+    df = frame()
+    ctx = FrameContext(df)
+    first = Strategy('close > bb.UB', 'close < bb.UB', {'bb': BB(20, 1)})
+    second = Strategy('close > BB(20, 1).MB', 'close < BB(10, 1).LB')
+    first.masks(df, ctx)
+    second.masks(df, ctx)
+    assert calls == [BB(20, 1).key(), BB(10, 1).key()]
+    first.masks(df)
+    assert len(calls) == 3
+
+
+@pytest.mark.parametrize('rule', ["close.shift(1) > 1", "close[1] > 1", "close > 'a'", "open(0)",
+                                  "__import__('os').system('true')", "lambda: close", "close if high else low",
+                                  "close == high"])
+def test_compile_rule_rejects_unsupported_nodes(rule):
+    with pytest.raises(Exception, match='Unsupported expression'):
+        compile_rule(rule)
+
+
+def test_unknown_names_are_reported_with_their_rule():
+    with pytest.raises(Exception, match=r"entry rule \(close > bbb\) uses \['bbb'\]"):
+        Strategy('close > bbb', 'close < bb.UB', {'bb': BB()}).masks(frame())
+    with pytest.raises(Exception, match="Unknown attribute bbb.UB"):
+        Strategy('close > bbb.UB', 'close < bb.UB', {'bb': BB()})
+
+
+@pytest.mark.parametrize('indicator, first_valid', [(SMA(5), 4), (EMA(5), 4), (RSI(14), 14), (SMA(3, 'high'), 2)])
+def test_indicator_warm_up(indicator, first_valid):
+    values = FrameContext(frame()).indicator(indicator)
+    assert numpy.isnan(values[:first_valid]).all()
+    assert not numpy.isnan(values[first_valid:]).any()
@@ -0,0 +1,34 @@
+import numpy
+import pytest
+
+from BtAssessmentLib import BTest
+from BtAssessmentLib.deps import RollingBB, bb, pandas
+from BtAssessmentLib.stream import replay
+from conftest import TICKERS
+
+
+@pytest.mark.parametrize('bar_interval, change_bar_interval_at_start',
+                         [('1min', False), ('5min', True), ('15min', True)])
+@pytest.mark.parametrize('ordertype', ['CNC', 'MIS'])
+def test_replay_matches_run(btest_kwargs, bar_interval, change_bar_interval_at_start, ordertype):
+    kwargs = {**btest_kwargs, 'bar_interval': bar_interval, 'ordertype': ordertype,
+              'change_bar_interval_at_start': change_bar_interval_at_start}
+    for ticker in TICKERS:
+        expected = BTest(ticker=ticker, **kwargs).run()
+        assert len(expected) > 0
+        assert replay(BTest(ticker=ticker, stream=True, **kwargs)) == expected
+
+
+def test_rolling_bb_matches_bb():
+    rng = numpy.random.default_rng(7)
+    close = numpy.round(1000 + rng.normal(0, 2, 400).cumsum(), 2)
+    close[50:90] = close[50]          # constant stretch longer than the window
+    close[150:155] = numpy.nan        # gap inside a window
+    close[200:230] = numpy.nan        # gap longer than the window
+    close[300:310] = -close[300:310]  # negative values
+    close[320:345] = 0.0
+    expected = bb(pandas.DataFrame({'CloseValue': close}), window=20, std=2)
+    bands = RollingBB(window=20, std=2)
+    result = numpy.array([bands.update(c) for c in close])
+    for i, col in enumerate(['MB', 'UB', 'LB']):
+        numpy.testing.assert_array_equal(result[:, i], expected[col].to_numpy())
@@ -0,0 +1,73 @@
+import itertools
+
+import numpy
+import pandas
+import pytest
+
+from BtAssessmentLib import BT
+from BtAssessmentLib.engine import NS_PER_DAY
+from BtAssessmentLib.sweep import expand_grid, prepared_groups
+from BtAssessmentLib.walkforward import fold_bounds
+from BtAssessmentLib.workers import evaluate, slice_arrays
+from conftest import START_DATE, END_DATE, TICKERS
+
+GRID = {'stop_loss': [.1, .3], 'target': [.2, .4], 'window': [10, 20]}
+
+
+def test_fold_bounds():
+    days = numpy.array([19000, 19001, 19004, 19005, 19006, 19007, 19008, 19011])
+    folds = fold_bounds(days, train_days=3, test_days=2)
+    assert [tuple(x // NS_PER_DAY for x in fold) for fold in folds] == \
+        [(19000, 19005, 19007), (19004, 19007, 19011)]
+    for (train_start, test_start, test_stop), following in zip(folds, folds[1:] + [None]):
+        assert train_start < test_start < test_stop
+        if following is not None:
+            assert following[1] == test_stop
+    assert fold_bounds(days, train_days=6, test_days=2)[-1][2] // NS_PER_DAY == 19012
+    assert fold_bounds(days, train_days=7, test_days=2) == []
+
+
+def test_slice_arrays_do_not_overlap(db):
+    settings = bt(db).btest_kwargs()
+    [(_, arrays)] = prepared_groups('T0', settings, expand_grid({}, settings))
+    train_start, test_start, test_stop = fold_bounds(numpy.unique(arrays['index'] // NS_PER_DAY), 2, 1)[0]
+    train, test = slice_arrays(arrays, train_start, test_start), slice_arrays(arrays, test_start, test_stop)
+    assert len(train['index']) and len(test['index'])
+    assert train['index'][0] >= train_start and train['index'][-1] < test_start <= test['index'][0]
+    assert test['index'][-1] < test_stop
+
+
+def bt(db):
+    return BT(ticker=TICKERS, start_date=START_DATE, end_date=END_DATE, bar_interval='5min', quantity=10,
+              capital=100000, stop_loss=.3, target=.4, db_name=db, change_bar_interval_at_start=True)
+
+
+@pytest.mark.parametrize('metric, direction, maximize', [('CumPnL', None, True), ('MaxDrawdown', None, False),
+                                                       ('CumPnL', False, False)])
+def test_selected_parameters(db, metric, direction, maximize):
+    b = bt(db)
+    result = b.walk_forward(GRID, train_days=3, test_days=2, metric=metric, maximize=direction, workers=1)
+    settings = b.btest_kwargs()
+    grid = expand_grid(GRID, settings)
+    combos = list(itertools.product(grid['stop_loss'], grid['target']))
+    assert len(result) == len(TICKERS) * 2
+    for ticker in TICKERS:
+        groups = list(prepared_groups(ticker, settings, grid))
+        for _, fold in result[result['Ticker'] == ticker].iterrows():
+            assert fold['TrainStart'] < fold['TestStart'] < fold['TestEnd']
+            train_start, test_start = fold['TrainStart'].value, fold['TestStart'].value
+            trained = [(params, summary.result()[metric]) for group, arrays in groups
+                       for params, summary in evaluate(group, slice_arrays(arrays, train_start, test_start),
+                                                       combos, settings)]
+            values = [value for _, value in trained]
+            best = max(values) if maximize else min(values)
+            assert fold[f'Train{metric}'] == best
+            chosen = {key: fold[key] for key in ('BarInterval', 'Window', 'Std', 'StopLoss', 'Target')}
+            # Ties keep the grid order.
+            params = next(params for params, value in trained if value == best)
+            assert chosen == {k: v for k, v in params.items() if k != 'Ticker'}
+
+
+def test_workers_do_not_change_the_result(db):
+    serial = bt(db).walk_forward(GRID, train_days=3, test_days=2, workers=1)
+    pandas.testing.assert_frame_equal(bt(db).walk_forward(GRID, train_days=3, test_days=2, workers=2), serial)